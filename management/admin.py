@@ -7,3 +7,6 @@ admin.site.register(models.Settings)
 admin.site.register(models.Admin)
 admin.site.register(models.Appointment)
 admin.site.register(models.HSemester)
+admin.site.register(models.RecurrenceRule)
+admin.site.register(models.Change)
+admin.site.register(models.OutgoingMail)
@@ -3,3 +3,6 @@ from django.apps import AppConfig
 
 class ManagementConfig(AppConfig):
     name = 'management'
+
+    def ready(self):
+        from management import signals  # noqa F401, pylint: disable=import-outside-toplevel,unused-import
@@ -0,0 +1,72 @@
+import time
+from datetime import datetime
+from typing import Iterable, List, Optional
+
+from django.apps import apps
+from django.db.models import F
+from django.utils import timezone
+
+
+def _initial_version() -> int:
+    # never restart at a version that may still have entries in the cache
+    return int(time.time() * 1000)
+
+
+def get_version_list(*names: str) -> List[str]:
+    versions = dict(apps.get_model('management', 'CacheVersion').objects.filter(
+        name__in=names).values_list('name', 'version'))
+    return [str(versions.get(name, 0)) for name in names]
+
+
+def get_versions(*names: str) -> str:
+    """
+    Return the current versions of the given namespaces, to be used as part
+    of cache keys. Bumping a version orphans all keys built from it.
+    """
+    return '.'.join(get_version_list(*names))
+
+
+def bump_versions(names: Iterable[str]):
+    """Bump the versions within the transaction of the change, so they become visible together"""
+    cache_version = apps.get_model('management', 'CacheVersion')
+    for name in set(names):
+        if cache_version.objects.filter(name=name).update(version=F('version') + 1):
+            continue
+        _, created = cache_version.objects.get_or_create(name=name, defaults={'version': _initial_version()})
+        if not created:
+            # created concurrently, still has to change for this bump
+            cache_version.objects.filter(name=name).update(version=F('version') + 1)
+
+
+def ical_feed(admin_pk: Optional[int] = None) -> str:
+    return 'ical:all' if admin_pk is None else f'ical:admin:{admin_pk}'
+
+
+def ical_cache_key(admin_pk: Optional[int] = None, variant: str = 'archive') -> str:
+    feed = ical_feed(admin_pk)
+    return f'management:{feed}:{variant}:{get_versions("ical", feed)}'
+
+
+def invalidate_ical(admin_pks: Iterable[int] = (), full_calendar: bool = False):
+    feeds = [ical_feed(pk) for pk in admin_pks]
+    if full_calendar:
+        feeds.append(ical_feed())
+    bump_versions(feeds)
+
+
+def invalidate_all_icals():
+    bump_versions(['ical'])
+
+
+def plan_month(d: datetime) -> str:
+    return f'plan:{timezone.localtime(d):%Y-%m}'
+
+
+def plan_versions(*months: datetime) -> List[str]:
+    """versions of the given months of the plan, one per month"""
+    return get_version_list(*[plan_month(month) for month in months])
+
+
+def invalidate_plan(start_times: Iterable[datetime]):
+    """invalidate the months of the plan showing appointments starting at the given times"""
+    bump_versions([plan_month(start_time) for start_time in start_times if start_time is not None])
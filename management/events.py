@@ -0,0 +1,114 @@
+import asyncio
+import threading
+from typing import Iterable, Optional
+
+from asgiref.sync import sync_to_async
+from django.apps import apps
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+
+class Subscription:
+    """Events for one client, queued in the event loop it subscribed from"""
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, maxsize: int):
+        self.loop = loop
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize)
+        # set once events were dropped, the client has to catch up from the change log
+        self.overflowed = False
+
+    def put(self, changes: list):
+        for change in changes:
+            try:
+                self.queue.put_nowait(change)
+            except asyncio.QueueFull:
+                self.overflowed = True
+                return
+
+    async def get(self, timeout: float):
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+class LocalBroadcaster:
+    """
+    Pass changes on to the clients of this process. Good enough for a single
+    worker, changes made by other processes are not seen.
+    """
+
+    def __init__(self):
+        self._subscriptions = set()
+        self._lock = threading.Lock()
+
+    def publish(self, changes: Iterable):
+        """Called from sync code once the changes were committed"""
+        self._dispatch(list(changes))
+
+    def _dispatch(self, changes: list):
+        if not changes:
+            return
+        with self._lock:
+            subscriptions = list(self._subscriptions)
+        for subscription in subscriptions:
+            subscription.loop.call_soon_threadsafe(subscription.put, changes)
+
+    def subscribe(self) -> Subscription:
+        subscription = Subscription(asyncio.get_running_loop(), settings.EVENTS_QUEUE_SIZE)
+        with self._lock:
+            self._subscriptions.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        with self._lock:
+            self._subscriptions.discard(subscription)
+
+
+class ChangeLogBroadcaster(LocalBroadcaster):
+    """
+    For several worker processes: every process follows the change log in the
+    database, with one query per EVENTS_POLL_INTERVAL as long as it has
+    clients.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._poller: Optional[asyncio.Task] = None
+
+    def publish(self, changes: Iterable):
+        # picked up from the change log like the changes of all other processes
+        pass
+
+    def subscribe(self) -> Subscription:
+        subscription = super().subscribe()
+        if self._poller is None or self._poller.done():
+            self._poller = asyncio.get_running_loop().create_task(self._poll())
+        return subscription
+
+    @staticmethod
+    def _changes_after(pk: int) -> list:
+        return list(apps.get_model('management', 'Change').objects.filter(pk__gt=pk)[:settings.CHANGES_PAGE_SIZE])
+
+    @staticmethod
+    def _last_change() -> int:
+        return apps.get_model('management', 'Change').objects.values_list('pk', flat=True).last() or 0
+
+    async def _poll(self):
+        last = await sync_to_async(self._last_change)()
+        while self._subscriptions:
+            await asyncio.sleep(settings.EVENTS_POLL_INTERVAL)
+            changes = await sync_to_async(self._changes_after)(last)
+            if changes:
+                last = changes[-1].pk
+                self._dispatch(changes)
+
+
+_broadcaster = None
+
+
+def broadcaster() -> LocalBroadcaster:
+    global _broadcaster  # pylint: disable=global-statement
+    if _broadcaster is None:
+        _broadcaster = import_string(settings.EVENTS_BACKEND)()
+    return _broadcaster
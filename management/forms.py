@@ -1,11 +1,12 @@
-from datetime import datetime, timedelta, date as fdate
-from typing import Optional
+from datetime import datetime, date as fdate
+from typing import List, Optional
 
 from dateutil import tz
 from django import forms
 from django.conf import settings
 
 from management.models import Admin, Appointment, HSemester, Settings
+from management.signals import appointments_created
 
 
 class SettingsForm(forms.Form):
@@ -15,12 +16,16 @@ class SettingsForm(forms.Form):
     ACTION_SAVE = 'save'
     ACTION_DELETE = 'delete'
 
-    def __init__(self, *args, setting_name: Optional[str] = None, **kwargs):
+    def __init__(self, *args, setting_name: Optional[str] = None, setting_rows: Optional[List[Settings]] = None,
+                 **kwargs):
         super().__init__(*args, **kwargs)
         self.setting_name = setting_name
         if self.setting_name:
             self.fields['name'].initial = self.setting_name
-            self.update_settings()
+            if setting_rows is None:
+                self.update_settings()
+            else:
+                self.settings = setting_rows
         else:
             self.settings = None
 
@@ -90,23 +95,30 @@ class AddAppointmentsForm(forms.Form):
 
         cleaned_data['appointments'] = []
 
-        for appointment_time in self.data.getlist('appointments'):
+        time_zone = tz.gettz(settings.TIME_ZONE)
+        # every appointment is posted as "<start>/<end>", the end time of its recurrence rule as previewed
+        for appointment_times in self.data.getlist('appointments'):
             try:
-                start_time = datetime.fromisoformat(appointment_time)
-                start_time.replace(tzinfo=tz.gettz(settings.TIME_ZONE))
+                start_time, end_time = (datetime.fromisoformat(t) for t in appointment_times.split('/'))
             except ValueError as e:
-                raise forms.ValidationError(str(e))
+                raise forms.ValidationError(f'Ungültige Sprechstunde: {appointment_times}') from e
+            if start_time.tzinfo is None:
+                start_time = start_time.replace(tzinfo=time_zone)
+            if end_time.tzinfo is None:
+                end_time = end_time.replace(tzinfo=time_zone)
+            if end_time <= start_time:
+                raise forms.ValidationError('Das Ende einer Sprechstunde muss nach ihrem Beginn liegen')
 
-            cleaned_data['appointments'].append(
-                Appointment(start_time=start_time, end_time=start_time + timedelta(minutes=30))
-            )
+            cleaned_data['appointments'].append(Appointment(start_time=start_time, end_time=end_time))
 
         self.cleaned_data = cleaned_data
 
         return self.cleaned_data
 
     def save(self):
-        Appointment.objects.bulk_create(self.cleaned_data['appointments'])
+        # submitting the same appointments twice, e.g. concurrently, must not create duplicates
+        appointments = Appointment.create_missing(self.cleaned_data['appointments'])
+        appointments_created.send(sender=Appointment, appointments=appointments)
 
 
 class EditAppointmentForm(forms.ModelForm):
@@ -165,8 +177,8 @@ class EditAppointmentForm(forms.ModelForm):
         instance.end_time = self.cleaned_data['end_datetime']
         if commit:
             instance.save()
-            instance.admins.clear()
-            instance.admins.add(*self.cleaned_data['admins'])
+            # only the actually added and removed admins send m2m_changed, so unchanged ones are not logged
+            instance.admins.set(self.cleaned_data['admins'])
 
         return instance
 
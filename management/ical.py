@@ -0,0 +1,119 @@
+import hashlib
+from collections import defaultdict
+from datetime import datetime, timezone
+from itertools import islice
+from typing import Dict, Iterable, Iterator, List
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import QuerySet
+from django.utils.formats import localize
+from django.utils.html import conditional_escape
+from django.utils.timezone import template_localtime
+
+ICAL_CHUNK_SIZE = 500
+
+
+def _text(value) -> str:
+    # same conversion the template engine applies to {{ value }}
+    return str(conditional_escape(localize(template_localtime(value))))
+
+
+def _utc(value: datetime) -> str:
+    return value.astimezone(timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+
+
+def _attendees(appointments: QuerySet, pks: List[int]) -> Dict[int, List[str]]:
+    through = appointments.model.admins.through
+    rows = through.objects.filter(appointment_id__in=pks).order_by('admin_id').values_list(
+        'appointment_id', 'admin__first_name', 'admin__last_name')
+
+    attendees = defaultdict(list)
+    for appointment_pk, first_name, last_name in rows:
+        attendees[appointment_pk].append(f'{first_name} {last_name}')
+    return attendees
+
+
+def _chunks(rows: Iterable[dict], size: int) -> Iterator[List[dict]]:
+    rows = iter(rows)
+    while True:
+        chunk = list(islice(rows, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _event_cache_key(row: dict, with_attendants: bool, location_digest: str) -> str:
+    return f'management:vevent:{row["pk"]}:{row["sequence"]}:{row["updated_at"].timestamp():.6f}:' \
+           f'{int(with_attendants)}:{location_digest}'
+
+
+def vevent(row: dict, location: str, attendees: Iterable[str] = ()) -> str:
+    lines = [
+        '',
+        '',
+        'BEGIN:VEVENT',
+        f'UID:{row["pk"]}',
+        f'SEQUENCE:{row["sequence"]}',
+        f'LAST-MODIFIED:{_utc(row["updated_at"])}',
+        f'DTSTART:{_utc(row["start_time"])}',
+        f'DTEND:{_utc(row["end_time"])}',
+        f'LOCATION:{_text(location)}',
+        f'SUMMARY:StuStaNet e.V. Sprechstunde - {_text(row["start_time"])} Uhr',
+    ]
+    lines += [f'ATTENDEE;PARTSTAT=ACCEPTED;CN="{_text(name)}":mailto:nobody@stusta.de' for name in attendees]
+    lines.append('END:VEVENT')
+    return '\n'.join(lines)
+
+
+def iter_ical(appointments: QuerySet, title: str, location: str, with_attendants: bool = False,
+              chunk_size: int = ICAL_CHUNK_SIZE) -> Iterator[str]:
+    """
+    Yield the calendar piece by piece, one chunk of events at a time, so that
+    arbitrarily long feeds never have to be held in memory as a whole.
+
+    Events are cached by their version, so only the ones that changed since
+    the last rebuild have to be serialized again.
+    """
+    location_digest = hashlib.sha256(location.encode()).hexdigest()[:16]
+
+    yield '\n'.join([
+        'BEGIN:VCALENDAR',
+        'VERSION:2.0',
+        'PRODID:-//StuStaNet e. V.//Sprechstundensystem//DE',
+        f'X-WR-CALNAME:{_text(title)}',
+    ])
+
+    rows = appointments.values('pk', 'start_time', 'end_time', 'sequence', 'updated_at').iterator(
+        chunk_size=chunk_size)
+    for chunk in _chunks(rows, chunk_size):
+        keys = [_event_cache_key(row, with_attendants, location_digest) for row in chunk]
+        events = cache.get_many(keys)
+
+        missing = [(key, row) for key, row in zip(keys, chunk) if key not in events]
+        if missing:
+            attendees = _attendees(appointments, [row['pk'] for _, row in missing]) if with_attendants else {}
+            rendered = {key: vevent(row, location, attendees.get(row['pk'], ())) for key, row in missing}
+            cache.set_many(rendered, settings.ICAL_EVENT_CACHE_TIMEOUT)
+            events.update(rendered)
+
+        yield ''.join(events[key] for key in keys)
+
+    yield '\nEND:VCALENDAR'
+
+
+def cached(cache_key: str, chunks: Iterator[str]) -> Iterator[str]:
+    """
+    Serve a calendar from the cache, or stream it from `chunks` and store it
+    once it was sent completely.
+    """
+    cal = cache.get(cache_key)
+    if cal is not None:
+        yield cal
+        return
+
+    parts = []
+    for part in chunks:
+        parts.append(part)
+        yield part
+    cache.set(cache_key, ''.join(parts), settings.ICAL_CACHE_TIMEOUT)
@@ -0,0 +1,18 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from management.models import Change
+
+
+class Command(BaseCommand):
+    help = 'Removes superseded changes and deletions from the change log once they are older than the retention period'
+
+    def add_arguments(self, parser):
+        parser.add_argument('-d', '--days', type=int, default=settings.CHANGES_RETENTION_DAYS)
+
+    def handle(self, *args, **options):
+        removed = Change.compact(timezone.now() - timedelta(days=options['days']))
+        self.stdout.write(self.style.SUCCESS(f'Successfully removed {removed} changes'))
@@ -0,0 +1,81 @@
+import math
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Tuple
+
+from django.conf import settings
+from django.core.mail import get_connection
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from management.models import OutgoingMail
+
+
+class Command(BaseCommand):
+    help = 'Delivers the due mails of the outbox, retries failed ones later and gives up after MAIL_MAX_ATTEMPTS'
+
+    def add_arguments(self, parser):
+        parser.add_argument('-w', '--workers', type=int, default=settings.MAIL_WORKERS)
+        parser.add_argument('-b', '--batch-size', type=int, default=settings.MAIL_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        # every worker thread reuses its own connection for all of its mails
+        local = threading.local()
+        connections = []
+        connections_lock = threading.Lock()
+
+        def deliver(mail: OutgoingMail) -> Tuple[OutgoingMail, Optional[Exception], float]:
+            connection = getattr(local, 'connection', None)
+            if connection is None:
+                connection = local.connection = get_connection()
+                with connections_lock:
+                    connections.append(connection)
+
+            started = time.monotonic()
+            try:
+                connection.open()
+                connection.send_messages([mail.as_message()])
+            except Exception as error:  # pylint: disable=broad-except
+                # start over with a fresh connection for the next mail
+                connection.close()
+                return mail, error, time.monotonic() - started
+            return mail, None, time.monotonic() - started
+
+        started = time.monotonic()
+        latencies = []
+        delivered = failed = dead = 0
+        try:
+            with ThreadPoolExecutor(max_workers=options['workers']) as pool:
+                while True:
+                    # claimed mails are not due for other runs, failed ones are due again only after their backoff
+                    mails = OutgoingMail.claim(timezone.now(), options['batch_size'])
+                    if not mails:
+                        break
+
+                    for mail, error, latency in pool.map(deliver, mails):
+                        latencies.append(latency)
+                        if error is None:
+                            mail.delivered(timezone.now())
+                            delivered += 1
+                            continue
+
+                        mail.failed(error, timezone.now())
+                        failed += 1
+                        if mail.state == OutgoingMail.DEAD:
+                            dead += 1
+                            self.stderr.write(f'Giving up on mail {mail.pk} ({mail.subject}): {mail.last_error}')
+                    OutgoingMail.objects.bulk_update(mails, ['state', 'attempts', 'next_attempt', 'sent', 'last_error'])
+        finally:
+            for connection in connections:
+                connection.close()
+
+        duration = max(time.monotonic() - started, 1e-6)
+        self.stdout.write(self.style.SUCCESS(
+            f'Successfully delivered {delivered} mails in {duration:.2f}s ({delivered / duration:.1f} mails/s), '
+            f'{failed} failed of which {dead} were given up'))
+        if latencies:
+            latencies.sort()
+            self.stdout.write(
+                f'Latency per mail: mean {sum(latencies) / len(latencies) * 1000:.0f}ms, '
+                f'p95 {latencies[math.ceil(0.95 * len(latencies)) - 1] * 1000:.0f}ms, max {latencies[-1] * 1000:.0f}ms')
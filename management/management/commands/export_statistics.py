@@ -0,0 +1,32 @@
+from datetime import date, datetime
+
+from dateutil import tz
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from management.statistics import iter_csv, iter_json, semester_breakdown, semester_rows
+
+
+class Command(BaseCommand):
+    help = 'Export the number of appointments per admin and semester'
+
+    def add_arguments(self, parser):
+        parser.add_argument('-f', '--format', choices=['csv', 'json'], default='csv')
+        parser.add_argument('--from-date', type=date.fromisoformat)
+        parser.add_argument('--to-date', type=date.fromisoformat)
+
+    def handle(self, *args, **options):
+        time_zone = tz.gettz(settings.TIME_ZONE)
+        from_datetime = None
+        if options['from_date']:
+            from_datetime = datetime.combine(options['from_date'], datetime.min.time(), tzinfo=time_zone)
+        # like the statistics page, only count appointments that already took place by default
+        to_datetime = timezone.now()
+        if options['to_date']:
+            to_datetime = datetime.combine(options['to_date'], datetime.max.time(), tzinfo=time_zone)
+
+        rows = semester_rows(semester_breakdown(from_datetime, to_datetime))
+        writer = iter_json if options['format'] == 'json' else iter_csv
+        for chunk in writer(rows):
+            self.stdout.write(chunk, ending='')
@@ -0,0 +1,33 @@
+from datetime import date
+
+from dateutil.relativedelta import relativedelta
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import formats
+
+from management.models import Appointment
+from management.signals import appointments_created
+
+
+class Command(BaseCommand):
+    help = 'Creates the appointments planned by the recurrence rules'
+
+    def add_arguments(self, parser):
+        parser.add_argument('-m', '--months', type=int, default=12)
+        parser.add_argument('--from-date', type=date.fromisoformat, default=date.today())
+        parser.add_argument('-n', '--dry-run', action='store_true')
+
+    def handle(self, *args, **options):
+        from_date = options['from_date']
+        appointments = Appointment.plan(from_date, from_date + relativedelta(months=options['months']))
+
+        if options['dry_run']:
+            for appointment in appointments:
+                self.stdout.write(formats.date_format(appointment.start_time, 'DATETIME_FORMAT'))
+            return
+
+        with transaction.atomic():
+            created = Appointment.create_missing(appointments)
+            appointments_created.send(sender=Appointment, appointments=created)
+
+        self.stdout.write(self.style.SUCCESS(f'Successfully created {len(created)} appointments'))
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import F
+
+from management.models import Appointment
+
+
+class Command(BaseCommand):
+    help = 'Verifies the stored number of admins of all appointments and fixes the ones that drifted'
+
+    def add_arguments(self, parser):
+        parser.add_argument('-n', '--dry-run', action='store_true', help='only report the drifted appointments')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            drifted = Appointment.objects.annotate(actual=Appointment.counted_admins()).exclude(
+                admin_count=F('actual'))
+            for appointment in drifted:
+                self.stdout.write(f'{appointment}: {appointment.admin_count} stored, {appointment.actual} actual')
+
+            if options['dry_run']:
+                self.stdout.write(self.style.SUCCESS('Successfully checked all appointments'))
+                return
+
+            repaired = Appointment.objects.filter(pk__in=drifted.values('pk')).update(
+                admin_count=Appointment.counted_admins())
+        self.stdout.write(self.style.SUCCESS(f'Successfully repaired {repaired} appointments'))
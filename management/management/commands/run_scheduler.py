@@ -0,0 +1,76 @@
+import heapq
+import signal
+import threading
+from datetime import datetime, timedelta
+from typing import List, Optional, Tuple
+
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from django.db.models import Min
+from django.utils import timezone
+
+from management.models import Appointment, Modification, OutgoingMail
+from management.notifications import REMINDER_LEAD, check_for_enough_dates, process_reminders
+
+
+def due_reminders(now: datetime) -> List[Tuple[datetime, int]]:
+    """Heap of (due time, pk) of the reminders still to be sent, due when process_reminders picks them up"""
+    heap = [(end_time - REMINDER_LEAD, pk) for end_time, pk in Appointment.objects.filter(
+        reminder_sent=False, start_time__gt=now).values_list('end_time', 'pk')]
+    heapq.heapify(heap)
+    return heap
+
+
+def next_delivery() -> Optional[datetime]:
+    return OutgoingMail.objects.filter(state=OutgoingMail.PENDING).aggregate(next=Min('next_attempt'))['next']
+
+
+class Command(BaseCommand):
+    help = 'Sends reminders and notifications when they are due instead of polling from cron, runs until stopped'
+
+    def add_arguments(self, parser):
+        parser.add_argument('-p', '--poll-interval', type=float, default=settings.SCHEDULER_POLL_INTERVAL)
+
+    def handle(self, *args, **options):
+        stop = threading.Event()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(signum, lambda *_: stop.set())
+
+        poll_interval = timedelta(seconds=options['poll_interval'])
+        heap, modified = None, None
+        next_dates_check = timezone.now()
+
+        while not stop.is_set():
+            close_old_connections()
+            now = timezone.now()
+
+            # the only queries while idle, reload the due times once appointments changed
+            last_modified = Modification.last_modified(Appointment)
+            if heap is None or last_modified != modified:
+                heap, modified = due_reminders(now), last_modified
+            # also picks up mails queued by other processes, e.g. the admin or a cron send_notifications
+            next_mail = next_delivery()
+
+            queued = False
+            if heap and heap[0][0] <= now:
+                process_reminders()
+                # also drops reminders claimed by another runner in the meantime
+                while heap and heap[0][0] <= now:
+                    heapq.heappop(heap)
+                queued = True
+
+            if next_dates_check <= now:
+                check_for_enough_dates()
+                next_dates_check = now + timedelta(seconds=settings.SCHEDULER_DATES_CHECK_INTERVAL)
+                queued = True
+
+            if queued or (next_mail is not None and next_mail <= now):
+                call_command('deliver_mail', stdout=self.stdout, stderr=self.stderr)
+                next_mail = next_delivery()
+
+            wake = min(filter(None, (heap[0][0] if heap else None, next_dates_check, next_mail, now + poll_interval)))
+            stop.wait(max((wake - timezone.now()).total_seconds(), 0))
+
+        self.stdout.write(self.style.SUCCESS('Successfully stopped the scheduler'))
@@ -1,13 +1,15 @@
 from django.core.management.base import BaseCommand
 
+from management import settings_registry
 from management.notifications import check_for_enough_dates, process_reminders
 
 
 class Command(BaseCommand):
-    help = 'Processes current reminders'
+    help = 'Queues current reminders and notifications in the outbox'
 
     def handle(self, *args, **options):
-        process_reminders()
-        check_for_enough_dates()
+        current_settings = settings_registry.snapshot()
+        process_reminders(current_settings)
+        check_for_enough_dates(current_settings)
 
-        self.stdout.write(self.style.SUCCESS('Successfully processed all reminders and notifications'))
+        self.stdout.write(self.style.SUCCESS('Successfully queued all reminders and notifications'))
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:45
+
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def create_modifications(apps, schema_editor):
+    Modification = apps.get_model('management', 'Modification')
+    Appointment = apps.get_model('management', 'Appointment')
+    tracked_models = [
+        Appointment,
+        Appointment.admins.through,
+        apps.get_model('management', 'Admin'),
+        apps.get_model('management', 'Settings'),
+    ]
+    Modification.objects.bulk_create([
+        Modification(table=model._meta.db_table, modified=timezone.now()) for model in tracked_models
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('management', '0004_hsemester'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Modification',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('table', models.CharField(max_length=255, unique=True)),
+                ('modified', models.DateTimeField()),
+            ],
+        ),
+        migrations.RunPython(create_modifications, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('management', '0006_appointment_version'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='appointment',
+            name='start_time',
+            field=models.DateTimeField(db_index=True),
+        ),
+    ]
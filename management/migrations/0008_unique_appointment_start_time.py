@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:53
+
+from django.db import migrations, models
+
+
+def merge_duplicate_appointments(apps, schema_editor):
+    Appointment = apps.get_model('management', 'Appointment')
+    kept = {}
+    for appointment in Appointment.objects.order_by('start_time', 'pk'):
+        if appointment.start_time not in kept:
+            kept[appointment.start_time] = appointment
+            continue
+        # keep the first one, with the admins of all of them
+        kept[appointment.start_time].admins.add(*appointment.admins.all())
+        appointment.delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('management', '0007_appointment_start_time_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_appointments, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='appointment',
+            name='start_time',
+            field=models.DateTimeField(),
+        ),
+        migrations.AddConstraint(
+            model_name='appointment',
+            constraint=models.UniqueConstraint(fields=('start_time',), name='unique_appointment_start_time'),
+        ),
+    ]
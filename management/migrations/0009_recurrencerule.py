@@ -0,0 +1,40 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:55
+
+import datetime
+from django.db import migrations, models
+
+# copied, migrations must not change with the code
+DEFAULT_RULE = 'FREQ=WEEKLY;BYDAY=MO,TH;BYHOUR=19;BYMINUTE=0;BYSECOND=0'
+
+
+def create_default_rule(apps, schema_editor):
+    # the schedule that used to be hardcoded in Appointment.create_for_month
+    apps.get_model('management', 'RecurrenceRule').objects.create(
+        name='Sprechstunde',
+        rule=DEFAULT_RULE,
+        first_day=datetime.date(2020, 1, 1),
+        duration=datetime.timedelta(minutes=30),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('management', '0008_unique_appointment_start_time'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecurrenceRule',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255)),
+                ('rule', models.CharField(help_text='RRULE nach RFC 5545, Uhrzeiten in lokaler Zeit', max_length=255)),
+                ('first_day', models.DateField(help_text='Beginn der Wiederholung')),
+                ('duration', models.DurationField(default=datetime.timedelta(seconds=1800))),
+                ('skip_holidays', models.BooleanField(default=False)),
+                ('active', models.BooleanField(default=True)),
+            ],
+        ),
+        migrations.RunPython(create_default_rule, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,57 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:01
+
+from django.db import migrations, models
+
+
+def log_current_state(apps, schema_editor):
+    # so that clients starting from scratch get everything
+    Change = apps.get_model('management', 'Change')
+    Appointment = apps.get_model('management', 'Appointment')
+    changes = []
+    for pk, first_name, last_name in apps.get_model('management', 'Admin').objects.values_list(
+            'pk', 'first_name', 'last_name'):
+        changes.append(Change(kind='admin', action='created', object_id=pk, data={'name': f'{first_name} {last_name}'}))
+    for pk, admin_pk, h_semester_date in apps.get_model('management', 'HSemester').objects.values_list(
+            'pk', 'admin_id', 'date'):
+        changes.append(Change(kind='hsemester', action='created', object_id=pk,
+                              data={'admin': admin_pk, 'date': h_semester_date.isoformat()}))
+    for pk, start_time, end_time in Appointment.objects.values_list('pk', 'start_time', 'end_time'):
+        changes.append(Change(kind='appointment', action='created', object_id=pk,
+                              data={'start': start_time.timestamp(), 'end': end_time.timestamp()}))
+    for appointment_pk, admin_pk in Appointment.admins.through.objects.values_list('appointment_id', 'admin_id'):
+        changes.append(Change(kind='staffing', action='created', object_id=appointment_pk, related_id=admin_pk))
+    Change.objects.bulk_create(changes, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('management', '0009_recurrencerule'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Change',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created', models.DateTimeField(auto_now_add=True, db_index=True)),
+                ('kind', models.CharField(choices=[('appointment', 'Sprechstunde'), ('admin', 'Admin'), ('hsemester', 'Honorarsemester'), ('staffing', 'Eintragung')], max_length=16)),
+                ('action', models.CharField(choices=[('created', 'angelegt'), ('updated', 'geändert'), ('deleted', 'gelöscht')], max_length=16)),
+                ('object_id', models.IntegerField()),
+                ('related_id', models.IntegerField(blank=True, null=True)),
+                ('data', models.JSONField(blank=True, null=True)),
+            ],
+            options={
+                'ordering': ('pk',),
+            },
+        ),
+        migrations.CreateModel(
+            name='ChangeCompaction',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('horizon', models.IntegerField()),
+            ],
+        ),
+        migrations.RunPython(log_current_state, migrations.RunPython.noop),
+    ]
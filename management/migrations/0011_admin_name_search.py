@@ -0,0 +1,44 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:05
+
+import unicodedata
+
+from django.db import migrations, models
+
+
+# copy of management.utils.normalize_name, migrations must not change with the code
+LETTER_TRANSLATION = str.maketrans({'ø': 'o', 'ł': 'l', 'đ': 'd', 'ð': 'd', 'þ': 'th', 'æ': 'ae', 'œ': 'oe'})
+
+
+def normalize_name(name):
+    decomposed = unicodedata.normalize('NFKD', name.casefold().translate(LETTER_TRANSLATION))
+    return ' '.join(''.join(c for c in decomposed if not unicodedata.combining(c)).split())
+
+
+def fill_search_names(apps, schema_editor):
+    Admin = apps.get_model('management', 'Admin')
+    admins = list(Admin.objects.all())
+    for admin in admins:
+        admin.first_name_search = normalize_name(admin.first_name)
+        admin.last_name_search = normalize_name(admin.last_name)
+    Admin.objects.bulk_update(admins, ['first_name_search', 'last_name_search'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('management', '0010_change'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='admin',
+            name='first_name_search',
+            field=models.CharField(db_index=True, default='', editable=False, max_length=255),
+        ),
+        migrations.AddField(
+            model_name='admin',
+            name='last_name_search',
+            field=models.CharField(db_index=True, default='', editable=False, max_length=255),
+        ),
+        migrations.RunPython(fill_search_names, migrations.RunPython.noop),
+    ]
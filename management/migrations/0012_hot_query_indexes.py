@@ -0,0 +1,25 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('management', '0011_admin_name_search'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='appointment',
+            index=models.Index(condition=models.Q(('reminder_sent', False)), fields=['start_time'], name='appointment_reminder_pending'),
+        ),
+        migrations.AddIndex(
+            model_name='hsemester',
+            index=models.Index(fields=['admin', 'date'], name='hsemester_admin_date'),
+        ),
+        migrations.AddIndex(
+            model_name='settings',
+            index=models.Index(fields=['name', 'active'], name='settings_name_active'),
+        ),
+    ]
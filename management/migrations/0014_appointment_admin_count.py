@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:13
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_admins(apps, schema_editor):
+    Appointment = apps.get_model('management', 'Appointment')
+    counts = Appointment.admins.through.objects.filter(appointment=OuterRef('pk')).values('appointment').annotate(
+        count=Count('*'))
+    Appointment.objects.update(admin_count=Coalesce(Subquery(counts.values('count')), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('management', '0013_outgoingmail'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='appointment',
+            name='admin_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='appointment',
+            index=models.Index(fields=['admin_count', 'start_time'], name='appointment_admin_count'),
+        ),
+        migrations.RunPython(count_admins, migrations.RunPython.noop),
+    ]
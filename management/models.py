@@ -1,22 +1,44 @@
 import calendar
-from datetime import datetime, date
-from typing import List, Optional
+import heapq
+from datetime import datetime, date, timedelta
+from typing import Iterable, Iterator, List, Optional, Set
 
 from dateutil import tz
 from django.conf import settings
-from django.db import models
-from django.db.models import QuerySet
-from django.template.loader import render_to_string
+from django.core.exceptions import ValidationError
+from django.core.mail import EmailMessage
+from django.db import connection, models, transaction
+from django.db.models import Count, F, Max, QuerySet
+from django.db.models.functions import Coalesce
 from django.urls import reverse
-from django.utils import formats
+from django.utils import formats, timezone
 
-from management.utils import is_holiday, is_during_lecture_time
+from management import ical, recurrence, settings_registry
+from management.timeline import timelines
+from management.utils import add_months, is_holiday, is_during_lecture_time, normalize_name, prefix_range
+
+
+def claim(due: QuerySet, limit: int, **values) -> List[int]:
+    """
+    Update up to `limit` rows of `due` with `values`, which must take them out
+    of `due`, and return their pks. Rows claimed by a concurrent run are
+    skipped. Has to run in a transaction.
+    """
+    if connection.features.has_select_for_update_skip_locked:
+        pks = list(due.select_for_update(skip_locked=True).values_list('pk', flat=True)[:limit])
+        due.model.objects.filter(pk__in=pks).update(**values)
+        return pks
+    # one conditional update per row, it belongs to the run whose update changed the row
+    return [pk for pk in due.values_list('pk', flat=True)[:limit] if due.filter(pk=pk).update(**values)]
 
 
 class Admin(models.Model):
     first_name = models.CharField(max_length=255)
     last_name = models.CharField(max_length=255)
     email = models.EmailField()
+    # normalized names for the search
+    first_name_search = models.CharField(max_length=255, db_index=True, editable=False, default='')
+    last_name_search = models.CharField(max_length=255, db_index=True, editable=False, default='')
 
     class Meta:
         unique_together = [('first_name', 'last_name')]
@@ -24,6 +46,39 @@ class Admin(models.Model):
     def __str__(self) -> str:
         return f'{self.first_name} {self.last_name}'
 
+    def save(self, *args, **kwargs):
+        self.first_name_search = normalize_name(self.first_name)
+        self.last_name_search = normalize_name(self.last_name)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            kwargs['update_fields'] = set(update_fields) | {'first_name_search', 'last_name_search'}
+        super().save(*args, **kwargs)
+
+    @classmethod
+    def search(cls, query: str) -> QuerySet:
+        """
+        Admins whose first or last name starts with `query`, or whose first and
+        last name start with the words of `query` in either order, ignoring case
+        and diacritics.
+        """
+        query = normalize_name(query)
+        if not query:
+            return cls.objects.none()
+
+        def starts_with(field, prefix):
+            low, high = prefix_range(prefix)
+            return models.Q(**{f'{field}__gte': low, f'{field}__lt': high})
+
+        condition = starts_with('first_name_search', query) | starts_with('last_name_search', query)
+        # names may consist of several words as well, try every split
+        words = query.split(' ')[:settings.ADMIN_SEARCH_MAX_WORDS]
+        for i in range(1, len(words)):
+            head, tail = ' '.join(words[:i]), ' '.join(words[i:])
+            condition |= starts_with('first_name_search', head) & starts_with('last_name_search', tail)
+            condition |= starts_with('last_name_search', head) & starts_with('first_name_search', tail)
+
+        return cls.objects.filter(condition).order_by('last_name_search', 'first_name_search')
+
     @property
     def name(self) -> str:
         return f'{self.first_name} {self.last_name}'
@@ -34,26 +89,23 @@ class Admin(models.Model):
     def appointment_count(self):
         return self.appointments.count()
 
+    @classmethod
+    def with_counts(cls, admins: Optional[QuerySet] = None) -> QuerySet:
+        """annotate num_appointments and num_h_semesters, as subqueries since joining both would multiply them"""
+        admins = cls.objects.all() if admins is None else admins
+
+        def count(queryset):
+            counts = queryset.filter(admin=models.OuterRef('pk')).values('admin').annotate(count=Count('*'))
+            return Coalesce(models.Subquery(counts.values('count')), 0)
+
+        return admins.annotate(num_appointments=count(Appointment.admins.through.objects),
+                               num_h_semesters=count(HSemester.objects))
+
     def h_semester_count(self, end_date=None):
-        if not end_date:
-            return self.h_semesters.count()
-        else:
-            return self.h_semesters.filter(date__lte=end_date).count()
+        return timelines.get(self.pk).h_semester_count(end_date)
 
     def ss_since_last_h_semester(self, end_date=None):
-        if not end_date:
-            end_date = datetime.max.date()
-        if self.h_semesters.filter(date__lte=end_date).count() == 0:
-            last_h_semester_date = datetime.min.date()
-        else:
-            last_h_semester_date = self.h_semesters.filter(date__lte=end_date).order_by("-date").first().date
-        # use maxtime here as the sprechstunde on the same day as the honorary semester
-        # is awarded counts to this very honorary semester
-        last_h_semester_datetime = datetime.combine(
-            last_h_semester_date, datetime.max.time(), tzinfo=tz.gettz(settings.TIME_ZONE))
-        end_datetime = datetime.combine(
-            end_date, datetime.max.time(), tzinfo=tz.gettz(settings.TIME_ZONE))
-        return self.appointments.filter(start_time__gte=last_h_semester_datetime, start_time__lte=end_datetime).count()
+        return timelines.get(self.pk).appointments_since_last_h_semester(end_date)
 
 
 class HSemester(models.Model):
@@ -61,6 +113,12 @@ class HSemester(models.Model):
     date = models.DateField()
     admin = models.ForeignKey(Admin, on_delete=models.CASCADE, related_name="h_semesters")
 
+    class Meta:
+        indexes = [
+            # statistics per admin up to a date
+            models.Index(fields=['admin', 'date'], name='hsemester_admin_date'),
+        ]
+
     def __str__(self):
         return f"Honorarsemester an {self.admin} zugesprochen am {self.date}"
 
@@ -70,13 +128,37 @@ class Appointment(models.Model):
     end_time = models.DateTimeField()
     admins = models.ManyToManyField(Admin, blank=True, related_name='appointments')
     reminder_sent = models.BooleanField(default=False)
+    # number of admins, kept by the m2m_changed receivers, see repair_counts
+    admin_count = models.PositiveIntegerField(default=0, editable=False)
+    # version of the calendar entry, bumped on every change including its admins
+    sequence = models.PositiveIntegerField(default=0)
+    # only set together with sequence, not on every save
+    updated_at = models.DateTimeField(default=timezone.now)
 
     class Meta:
         ordering = ('start_time',)
+        constraints = [
+            # also serves the range queries on start_time
+            models.UniqueConstraint(fields=['start_time'], name='unique_appointment_start_time'),
+        ]
+        indexes = [
+            # appointments still waiting for their reminder, see process_reminders
+            models.Index(fields=['start_time'], condition=models.Q(reminder_sent=False),
+                         name='appointment_reminder_pending'),
+            # understaffed appointments
+            models.Index(fields=['admin_count', 'start_time'], name='appointment_admin_count'),
+        ]
 
     def __str__(self) -> str:
         return f'Sprechstunde {self.start_time} - {self.end_time}'
 
+    def save(self, *args, **kwargs):
+        if not self._state.adding and kwargs.get('update_fields') is None and not kwargs.get('force_insert'):
+            # admin_count is only written by update_admin_counts, this instance may hold an outdated one
+            kwargs['update_fields'] = {field.name for field in self._meta.concrete_fields
+                                       if not field.primary_key and field.name != 'admin_count'}
+        super().save(*args, **kwargs)
+
     @property
     def format_date(self) -> str:
         return formats.date_format(self.start_time, format='DATE_FORMAT', use_l10n=True)
@@ -87,43 +169,156 @@ class Appointment(models.Model):
 
     @property
     def comment(self):
-        holiday, comment = is_holiday(self.start_time.date())
+        day = timezone.localtime(self.start_time).date()
+        holiday, comment = is_holiday(day)
         if holiday:
             return comment
 
-        return is_during_lecture_time(self.start_time.date())[1]
+        return is_during_lecture_time(day)[1]
+
+    @classmethod
+    def touch(cls, pks):
+        """Bump the version of appointments whose calendar entry changed without them being saved"""
+        cls.objects.filter(pk__in=pks).update(sequence=F('sequence') + 1, updated_at=timezone.now())
+
+    @classmethod
+    def counted_admins(cls):
+        """The actual number of admins of the appointment in the outer query"""
+        counts = cls.admins.through.objects.filter(appointment=models.OuterRef('pk')).values('appointment').annotate(
+            count=Count('*'))
+        return Coalesce(models.Subquery(counts.values('count')), 0)
+
+    @classmethod
+    def update_admin_counts(cls, pks: Iterable[int]):
+        cls.objects.filter(pk__in=list(pks)).update(admin_count=cls.counted_admins())
+
+    @classmethod
+    def claim_reminders(cls, due: QuerySet, limit: int) -> List['Appointment']:
+        """
+        Mark up to `limit` of the `due` appointments as reminded and return
+        them, with their admins. Appointments claimed by a concurrent run are
+        skipped, so parallel runs never remind twice. Has to run in the
+        transaction that queues the reminders.
+        """
+        due = due.filter(reminder_sent=False)
+        if connection.vendor == 'sqlite' and connection.features.can_return_columns_from_insert:
+            # SQLite got UPDATE ... RETURNING together with INSERT ... RETURNING (3.35)
+            sql, params = due.values('pk')[:limit].query.sql_with_params()
+            table, pk, reminder_sent = (connection.ops.quote_name(name) for name in (
+                cls._meta.db_table, cls._meta.pk.column, cls._meta.get_field('reminder_sent').column))
+            # only quoted names from the model meta and the SQL compiled by the ORM, all values are parameters
+            statement = (f'UPDATE {table} SET {reminder_sent} = %s WHERE {reminder_sent} = %s AND {pk} IN ({sql}) '
+                         f'RETURNING {pk}')  # nosec B608
+            with connection.cursor() as cursor:
+                cursor.execute(statement, [True, False, *params])
+                pks = [row[0] for row in cursor.fetchall()]
+        else:
+            pks = claim(due, limit, reminder_sent=True)
+        return list(cls.objects.filter(pk__in=pks).prefetch_related('admins'))
 
     @classmethod
     def get_in_interval(cls, from_date: date, to_date: date):
         return cls.objects.filter(start_time__gte=from_date, start_time__lt=to_date)
 
     @classmethod
-    def create_for_month(cls, year: int, month: int) -> List['Appointment']:
+    def existing_days(cls, from_date: date, to_date: date) -> Set[date]:
+        """Local days from `from_date` up to and including `to_date` that already have an appointment"""
+        time_zone = tz.gettz(settings.TIME_ZONE)
+        appointments = cls.objects.filter(
+            start_time__gte=datetime.combine(from_date, datetime.min.time(), tzinfo=time_zone),
+            end_time__lte=datetime.combine(to_date, datetime.max.time(), tzinfo=time_zone),
+        ).values_list('start_time', 'end_time')
+
+        days = set()
+        for start_time, end_time in appointments:
+            start_day = timezone.localtime(start_time, time_zone).date()
+            if start_day == timezone.localtime(end_time, time_zone).date():
+                days.add(start_day)
+        return days
+
+    @classmethod
+    def plan(cls, from_date: date, to_date: date,
+             existing_days: Optional[Set[date]] = None) -> Iterator['Appointment']:
+        """
+        Lazily propose appointments according to the active recurrence rules
+        for the days from `from_date` up to and including `to_date` that do not
+        have one yet.
+        """
+        if existing_days is None:
+            existing_days = cls.existing_days(from_date, to_date)
+
+        time_zone = tz.gettz(settings.TIME_ZONE)
+        after = datetime.combine(from_date, datetime.min.time(), tzinfo=time_zone)
+        until = datetime.combine(to_date, datetime.max.time(), tzinfo=time_zone)
+        for start_time, end_time in RecurrenceRule.occurrences_between(after, until):
+            if start_time.date() not in existing_days:
+                yield Appointment(start_time=start_time, end_time=end_time)
+
+    @classmethod
+    def create_for_months(cls, year: int, month: int, months: int) -> List['Appointment']:
+        """Propose appointments for `months` months from the given one on, including the padding days of the weeks"""
         c = calendar.Calendar()
-        appointments = []
+        last_year, last_month = year + (month + months - 2) // 12, add_months(month, months - 1)
+        return list(cls.plan(next(c.itermonthdates(year, month)), list(c.itermonthdates(last_year, last_month))[-1]))
 
-        for d in c.itermonthdates(year, month):
-            day_start = datetime(d.year, d.month, d.day, 0, 0, 0, tzinfo=tz.gettz(settings.TIME_ZONE))
-            day_end = datetime(d.year, d.month, d.day, 23, 59, 59, tzinfo=tz.gettz(settings.TIME_ZONE))
-            if not cls.objects.filter(start_time__gte=day_start, end_time__lte=day_end).exists() and \
-                    (d.weekday() == 0 or d.weekday() == 3):
-                appointments.append(Appointment(
-                    start_time=datetime(d.year, d.month, d.day, 19, 0, 0, tzinfo=tz.gettz(settings.TIME_ZONE)),
-                    end_time=datetime(d.year, d.month, d.day, 19, 30, 0, tzinfo=tz.gettz(settings.TIME_ZONE))
-                ))
+    @classmethod
+    def create_missing(cls, appointments: Iterable['Appointment']) -> List['Appointment']:
+        """
+        Create the appointments whose start time is still free and return only
+        those, the others exist already, e.g. after submitting the same ones
+        twice. Their pks are not set.
+        """
+        appointments = list(appointments)
+        with transaction.atomic():
+            existing = set(cls.objects.filter(start_time__in=[appointment.start_time for appointment in appointments])
+                           .values_list('start_time', flat=True))
+            missing = [appointment for appointment in appointments if appointment.start_time not in existing]
+            # the unique constraint still guards against a concurrent insert of the same start time
+            cls.objects.bulk_create(missing, ignore_conflicts=True)
+        return missing
 
-        return appointments
+    @staticmethod
+    def iter_ical(appointments: QuerySet, title: str, with_attendants: bool = False,
+                  cache_key: Optional[str] = None) -> Iterator[str]:
+        location = settings_registry.snapshot().appointment_location
+        cal = ical.iter_ical(appointments, title, location, with_attendants=with_attendants)
+        if cache_key:
+            return ical.cached(cache_key, cal)
+        return cal
 
     @staticmethod
-    def as_ical(appointments: QuerySet, title: str, with_attendants: bool = False) -> str:
-        context = {
-            'appointments': appointments,
-            'with_attendants': with_attendants,
-            'title': title,
-            'location': Settings.get(Settings.SETTING_APPOINTMENT_LOCATION)
-        }
+    def as_ical(appointments: QuerySet, title: str, with_attendants: bool = False,
+                cache_key: Optional[str] = None) -> str:
+        return ''.join(Appointment.iter_ical(appointments, title, with_attendants=with_attendants,
+                                             cache_key=cache_key))
 
-        return render_to_string('management/ical.j2', context=context)
+
+class RecurrenceRule(models.Model):
+    """Regular appointments, e.g. FREQ=WEEKLY;BYDAY=MO,TH;BYHOUR=19;BYMINUTE=0;BYSECOND=0"""
+    name = models.CharField(max_length=255)
+    rule = models.CharField(max_length=255, help_text='RRULE nach RFC 5545, Uhrzeiten in lokaler Zeit')
+    first_day = models.DateField(help_text='Beginn der Wiederholung')
+    duration = models.DurationField(default=recurrence.DEFAULT_DURATION)
+    skip_holidays = models.BooleanField(default=False)
+    active = models.BooleanField(default=True)
+
+    def __str__(self) -> str:
+        return f'{self.name}: {self.rule}'
+
+    def clean(self):
+        try:
+            recurrence.parse(self.rule, self.first_day or date.today())
+        except (ValueError, TypeError) as e:
+            raise ValidationError({'rule': f'Ungültige Regel: {e}'})
+
+    def occurrences(self, after: datetime, until: Optional[datetime] = None) -> Iterator[recurrence.Slot]:
+        return recurrence.expand(self.rule, self.first_day, self.duration, after, until,
+                                 skip_holidays=self.skip_holidays)
+
+    @classmethod
+    def occurrences_between(cls, after: datetime, until: Optional[datetime] = None) -> Iterator[recurrence.Slot]:
+        """All occurrences of the active rules in order, expanded lazily"""
+        return heapq.merge(*[rule.occurrences(after, until) for rule in cls.objects.filter(active=True)])
 
 
 class Settings(models.Model):
@@ -131,35 +326,22 @@ class Settings(models.Model):
     value = models.TextField(max_length=2000)
     active = models.BooleanField(default=False)
 
-    SETTING_SENDER = 'sender'
-    SETTING_MAILING_LIST = 'mailing_list'
-    SETTING_REMINDER_NOTE = 'reminder_note'
-    SETTING_APPOINTMENT_LOCATION = 'appointment_location'
+    class Meta:
+        indexes = [
+            models.Index(fields=['name', 'active'], name='settings_name_active'),
+        ]
+
+    SETTING_SENDER = settings_registry.SENDER
+    SETTING_MAILING_LIST = settings_registry.MAILING_LIST
+    SETTING_REMINDER_NOTE = settings_registry.REMINDER_NOTE
+    SETTING_APPOINTMENT_LOCATION = settings_registry.APPOINTMENT_LOCATION
 
     def __str__(self) -> str:
         return f'{self.name}: {self.value}'
 
     @classmethod
     def get(cls, key: str, default: Optional[str] = None):
-        if cls.objects.filter(name=key, active=True).exists():
-            return cls.objects.filter(name=key, active=True).first().value
-
-        if default is not None:
-            return default
-
-        if key == cls.SETTING_SENDER:
-            return settings.DEFAULT_SENDER
-
-        if key == cls.SETTING_MAILING_LIST:
-            return settings.DEFAULT_MAILING_LIST
-
-        if key == cls.SETTING_REMINDER_NOTE:
-            return settings.DEFAULT_REMINDER_NOTE
-
-        if key == cls.SETTING_APPOINTMENT_LOCATION:
-            return settings.DEFAULT_APPOINTMENT_LOCATION
-
-        return None
+        return settings_registry.snapshot().get(key, default)
 
     @classmethod
     def verbose_name(cls, name):
@@ -176,3 +358,208 @@ class Settings(models.Model):
             return 'Ort'
 
         return name
+
+
+class Modification(models.Model):
+    """Last modification time of a whole table, used to validate cached feeds cheaply"""
+    table = models.CharField(max_length=255, unique=True)
+    modified = models.DateTimeField()
+
+    def __str__(self) -> str:
+        return f'{self.table} zuletzt geändert am {self.modified}'
+
+    @classmethod
+    def touch(cls, *tracked_models):
+        for model in tracked_models:
+            cls.objects.update_or_create(table=model._meta.db_table, defaults={'modified': timezone.now()})
+
+    @classmethod
+    def last_modified(cls, *tracked_models) -> Optional[datetime]:
+        tables = [model._meta.db_table for model in tracked_models]
+        return cls.objects.filter(table__in=tables).aggregate(modified=Max('modified'))['modified']
+
+    @classmethod
+    def stamps(cls, *tracked_models) -> tuple:
+        """
+        Modification times of the given tables, differs after any change to
+        them. Unlike last_modified this does not depend on the clocks of
+        different processes agreeing.
+        """
+        tables = [model._meta.db_table for model in tracked_models]
+        return tuple(cls.objects.filter(table__in=tables).order_by('table').values_list('table', 'modified'))
+
+
+class CacheVersion(models.Model):
+    """
+    Version of a namespace of cache keys, see management.caching. Kept in
+    the database so that all processes see a bump, whatever cache they use.
+    """
+    name = models.CharField(max_length=255, unique=True)
+    version = models.BigIntegerField()
+
+    def __str__(self) -> str:
+        return f'{self.name}: {self.version}'
+
+
+class Change(models.Model):
+    """Append-only log of changes, so that clients can sync incrementally by the id as cursor"""
+    APPOINTMENT = 'appointment'
+    ADMIN = 'admin'
+    H_SEMESTER = 'hsemester'
+    # an admin signed up for an appointment (created) or left it (deleted)
+    STAFFING = 'staffing'
+    KINDS = [
+        (APPOINTMENT, 'Sprechstunde'),
+        (ADMIN, 'Admin'),
+        (H_SEMESTER, 'Honorarsemester'),
+        (STAFFING, 'Eintragung'),
+    ]
+
+    CREATED = 'created'
+    UPDATED = 'updated'
+    DELETED = 'deleted'
+    ACTIONS = [
+        (CREATED, 'angelegt'),
+        (UPDATED, 'geändert'),
+        (DELETED, 'gelöscht'),
+    ]
+
+    created = models.DateTimeField(auto_now_add=True, db_index=True)
+    kind = models.CharField(max_length=16, choices=KINDS)
+    action = models.CharField(max_length=16, choices=ACTIONS)
+    object_id = models.IntegerField()
+    # the admin of a staffing change
+    related_id = models.IntegerField(null=True, blank=True)
+    # state of the object after the change, null for deletions
+    data = models.JSONField(null=True, blank=True)
+
+    class Meta:
+        ordering = ('pk',)
+
+    def __str__(self) -> str:
+        return f'{self.get_kind_display()} {self.object_id} {self.get_action_display()} am {self.created}'
+
+    def as_json(self) -> dict:
+        change = {
+            'type': self.kind,
+            'action': self.action,
+            'id': self.object_id,
+            'data': self.data,
+        }
+        if self.kind == self.STAFFING:
+            change['admin'] = self.related_id
+        return change
+
+    @classmethod
+    def compact(cls, before: datetime) -> int:
+        """
+        Remove the changes before `before` that are superseded by a later one
+        of the same object, and deletions. The remaining ones are the latest
+        state of every object.
+
+        Clients that did not see a removed deletion yet would miss it, so
+        cursors issued before and pointing before the last removed deletion
+        expire.
+        """
+        latest = cls.objects.values('kind', 'object_id', 'related_id').annotate(latest=Max('pk')).values('latest')
+        outdated = cls.objects.filter(created__lt=before).filter(
+            ~models.Q(pk__in=latest) | models.Q(action=cls.DELETED))
+
+        with transaction.atomic():
+            horizon = outdated.filter(action=cls.DELETED).aggregate(horizon=Max('pk'))['horizon']
+            if horizon is not None:
+                ChangeCompaction.objects.create(horizon=horizon)
+            deleted, _ = outdated.delete()
+        return deleted
+
+    @staticmethod
+    def generation() -> int:
+        return ChangeCompaction.objects.aggregate(generation=Max('pk'))['generation'] or 0
+
+    @staticmethod
+    def cursor_expired(pk: int, generation: int) -> bool:
+        return pk > 0 and ChangeCompaction.objects.filter(pk__gt=generation, horizon__gt=pk).exists()
+
+
+class ChangeCompaction(models.Model):
+    """Compaction of the change log that removed deletions"""
+    created = models.DateTimeField(auto_now_add=True)
+    # id of the last removed deletion, earlier cursors expired
+    horizon = models.IntegerField()
+
+    def __str__(self) -> str:
+        return f'Änderungen bis {self.horizon} am {self.created} zusammengefasst'
+
+
+class OutgoingMail(models.Model):
+    """Outbox of mails, enqueued together with the change that caused them and delivered by deliver_mail"""
+    PENDING = 'pending'
+    SENT = 'sent'
+    # given up after MAIL_MAX_ATTEMPTS failed attempts
+    DEAD = 'dead'
+    STATES = [
+        (PENDING, 'ausstehend'),
+        (SENT, 'versendet'),
+        (DEAD, 'aufgegeben'),
+    ]
+
+    created = models.DateTimeField(auto_now_add=True)
+    subject = models.TextField()
+    body = models.TextField()
+    from_email = models.CharField(max_length=255)
+    recipients = models.JSONField()
+    state = models.CharField(max_length=16, choices=STATES, default=PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt = models.DateTimeField(default=timezone.now)
+    sent = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+
+    class Meta:
+        ordering = ('pk',)
+        indexes = [
+            models.Index(fields=['state', 'next_attempt'], name='outgoingmail_due'),
+        ]
+
+    def __str__(self) -> str:
+        return f'{self.subject} an {", ".join(self.recipients)} ({self.get_state_display()})'
+
+    @classmethod
+    def enqueue(cls, messages: Iterable[EmailMessage]) -> List['OutgoingMail']:
+        return cls.objects.bulk_create([
+            cls(subject=message.subject, body=message.body, from_email=message.from_email,
+                recipients=message.recipients())
+            for message in messages
+        ])
+
+    @classmethod
+    def due(cls, now: datetime) -> QuerySet:
+        return cls.objects.filter(state=cls.PENDING, next_attempt__lte=now)
+
+    @classmethod
+    def claim(cls, now: datetime, limit: int) -> List['OutgoingMail']:
+        """
+        Lease up to `limit` due mails to this run for MAIL_LEASE seconds, so
+        that concurrent runs skip them. Should the run die, they are due again
+        once the lease ran out.
+        """
+        with transaction.atomic():
+            pks = claim(cls.due(now), limit, next_attempt=now + timedelta(seconds=settings.MAIL_LEASE))
+        return list(cls.objects.filter(pk__in=pks))
+
+    def as_message(self) -> EmailMessage:
+        return EmailMessage(self.subject, self.body, self.from_email, self.recipients)
+
+    def delivered(self, now: datetime):
+        self.state = self.SENT
+        self.sent = now
+        self.attempts += 1
+
+    def failed(self, error: Exception, now: datetime):
+        """Retry later with exponential backoff, or give up after MAIL_MAX_ATTEMPTS"""
+        self.attempts += 1
+        self.last_error = f'{type(error).__name__}: {error}'
+        if self.attempts >= settings.MAIL_MAX_ATTEMPTS:
+            self.state = self.DEAD
+            return
+        delay = min(settings.MAIL_RETRY_DELAY * 2 ** (self.attempts - 1), settings.MAIL_RETRY_MAX_DELAY)
+        self.next_attempt = now + timedelta(seconds=delay)
@@ -1,91 +1,106 @@
 from datetime import timedelta
+from typing import Optional
 
 from dateutil import tz
 from dateutil.relativedelta import relativedelta
 from django.conf import settings
-from django.core.mail import send_mail
-from django.template.loader import render_to_string
+from django.core.mail import EmailMessage
+from django.db import transaction
+from django.template.loader import get_template, render_to_string
 from django.utils import timezone, formats
 
-from management.models import Appointment, Settings
+from management import settings_registry
+from management.models import Appointment, OutgoingMail, RecurrenceRule
+from management.settings_registry import SettingsSnapshot
 
+# reminders are sent once the end of an appointment is at most this far away, a day plus 6 hours for tolerance
+REMINDER_LEAD = timedelta(days=1, hours=6)
 
-def send_reminders(appointment: Appointment):
+
+def _format_start_time(appointment: Appointment) -> str:
+    return formats.date_format(
+        appointment.start_time + tz.gettz(settings.TIME_ZONE).utcoffset(appointment.start_time),
+        "DATETIME_FORMAT", use_l10n=True)
+
+
+def send_reminders(appointment: Appointment, current_settings: SettingsSnapshot):
     admins = appointment.admins.all()
     context = {
-        'sender': Settings.get(Settings.SETTING_SENDER),
+        'sender': current_settings.sender,
         'admins': admins,
         'appointment': appointment,
-        'reminder_note': Settings.get(Settings.SETTING_REMINDER_NOTE)
+        'reminder_note': current_settings.reminder_note
     }
-    for admin in admins:
-        context['recipient'] = admin.name
-        message = render_to_string('management/mails/reminder.j2', context=context)
-        start_time = formats.date_format(
-            appointment.start_time + tz.gettz(settings.TIME_ZONE).utcoffset(appointment.start_time),
-            "DATETIME_FORMAT", use_l10n=True)
-        send_mail(
-            f'Erinnerung: Sprechstunde {start_time}',
-            message,
-            settings.EMAIL_SENDER,
-            [admin.email],
-            fail_silently=True
-        )
-
-
-def send_understaffed(appointment: Appointment):
-    if appointment.admins.all().count() >= settings.APPOINTMENT_UNDERSTAFFED_THRESHOLD:  # enough people, do nothing
+    # everything but the greeting is the same for all admins, render it once and only the greeting per admin
+    body = render_to_string('management/mails/reminder_body.j2', context=context)
+    greeting = get_template('management/mails/reminder.j2')
+    subject = f'Erinnerung: Sprechstunde {_format_start_time(appointment)}'
+    OutgoingMail.enqueue(
+        EmailMessage(subject, greeting.render({'recipient': admin.name, 'body': body}), settings.EMAIL_SENDER,
+                     [admin.email])
+        for admin in admins
+    )
+
+
+def send_understaffed(appointment: Appointment, current_settings: SettingsSnapshot):
+    if appointment.admin_count >= settings.APPOINTMENT_UNDERSTAFFED_THRESHOLD:  # enough people, do nothing
         return
 
     context = {
-        'sender': Settings.get(Settings.SETTING_SENDER),
+        'sender': current_settings.sender,
         'appointment': appointment
     }
     message = render_to_string('management/mails/understaffed.j2', context=context)
-    start_time = formats.date_format(
-        appointment.start_time + tz.gettz(settings.TIME_ZONE).utcoffset(appointment.start_time),
-        "DATETIME_FORMAT", use_l10n=True)
-    send_mail(
-        f'Sprechstunde {start_time}',
+    OutgoingMail.enqueue([EmailMessage(
+        f'Sprechstunde {_format_start_time(appointment)}',
         message,
         settings.EMAIL_SENDER,
-        [Settings.get(Settings.SETTING_MAILING_LIST)],
-        fail_silently=False
-    )
+        [current_settings.mailing_list],
+    )])
 
 
-def send_enter_new_appointment():
+def send_enter_new_appointment(current_settings: SettingsSnapshot):
     context = {
-        'sender': Settings.get(Settings.SETTING_SENDER)
+        'sender': current_settings.sender
     }
     message = render_to_string('management/mails/enter_new_appointments.j2', context=context)
-    send_mail(
+    OutgoingMail.enqueue([EmailMessage(
         'Neue Sprechstundentermine eintragen',
         message,
         settings.EMAIL_SENDER,
         [settings.EMAIL_VORSTAND],
-        fail_silently=False
-    )
+    )])
 
 
-def check_for_enough_dates():
+def check_for_enough_dates(current_settings: Optional[SettingsSnapshot] = None):
     """
-    Check for appointments to exist for at least 8 weeks in advance
+    Check for appointments to exist for at least 8 weeks in advance, i.e. up to
+    the last one the recurrence rules plan within that time
     """
-    deadline = timezone.now() + relativedelta(weeks=8)
+    now = timezone.now()
+    deadline = now + relativedelta(weeks=8)
+    planned = [start_time for start_time, _ in RecurrenceRule.occurrences_between(now, deadline)]
+    if planned:
+        deadline = planned[-1]
     last_appointment = Appointment.objects.filter(start_time__gte=deadline)
     if last_appointment.exists():  # we have enough appointments, do nothing
         return
 
-    send_enter_new_appointment()
+    send_enter_new_appointment(current_settings or settings_registry.snapshot())
 
 
-def process_reminders():
+def process_reminders(current_settings: Optional[SettingsSnapshot] = None):
+    # one snapshot for all mails of the run instead of a lookup per mail
+    current_settings = current_settings or settings_registry.snapshot()
     today = timezone.now()
-    tomorrow = today + timedelta(days=1, hours=6)  # plus 6 hours for tolerance
-    for appointment in Appointment.objects.filter(reminder_sent=False, start_time__gt=today, end_time__lte=tomorrow):
-        send_understaffed(appointment)
-        send_reminders(appointment)
-
-        appointment.reminder_sent = True
-        appointment.save()
+    tomorrow = today + REMINDER_LEAD
+    due = Appointment.objects.filter(start_time__gt=today, end_time__lte=tomorrow)
+    while True:
+        # the mails are only queued if the appointments are claimed, and the other way round
+        with transaction.atomic():
+            appointments = Appointment.claim_reminders(due, settings.REMINDER_BATCH_SIZE)
+            for appointment in appointments:
+                send_understaffed(appointment, current_settings)
+                send_reminders(appointment, current_settings)
+        if not appointments:
+            break
@@ -0,0 +1,36 @@
+from datetime import date, datetime, time, timedelta
+from typing import Iterator, Optional, Tuple
+
+from dateutil import tz
+from dateutil.rrule import rrule, rrulestr
+from django.conf import settings
+
+from management.utils import is_holiday
+
+# start and end of one occurrence
+Slot = Tuple[datetime, datetime]
+
+# Montag und Donnerstag, 19:00 - 19:30
+DEFAULT_RULE = 'FREQ=WEEKLY;BYDAY=MO,TH;BYHOUR=19;BYMINUTE=0;BYSECOND=0'
+DEFAULT_DURATION = timedelta(minutes=30)
+
+
+def parse(rule: str, first_day: date) -> rrule:
+    """Parse an RFC 5545 RRULE, times without BYHOUR etc. default to midnight local time of `first_day`"""
+    return rrulestr(rule, dtstart=datetime.combine(first_day, time(), tzinfo=tz.gettz(settings.TIME_ZONE)))
+
+
+def expand(rule: str, first_day: date, duration: timedelta, after: datetime, until: Optional[datetime] = None,
+           skip_holidays: bool = False) -> Iterator[Slot]:
+    """
+    Lazily yield the occurrences of `rule` starting at or after `after`, up to
+    and including `until` if given. Without `until` (and without UNTIL or COUNT
+    in the rule) this never ends.
+    """
+    for start in parse(rule, first_day).xafter(after, inc=True):
+        if until is not None and start > until:
+            return
+        if skip_holidays and is_holiday(start.date())[0]:
+            continue
+        # local wall clock times, so this stays right across DST changes
+        yield start, start + duration
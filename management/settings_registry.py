@@ -0,0 +1,82 @@
+from dataclasses import dataclass
+from types import MappingProxyType
+from typing import Mapping, Optional, Tuple
+
+from django.apps import apps
+from django.conf import settings
+
+SENDER = 'sender'
+MAILING_LIST = 'mailing_list'
+REMINDER_NOTE = 'reminder_note'
+APPOINTMENT_LOCATION = 'appointment_location'
+
+# names of the django settings used if a setting has no active value
+DEFAULTS = {
+    SENDER: 'DEFAULT_SENDER',
+    MAILING_LIST: 'DEFAULT_MAILING_LIST',
+    REMINDER_NOTE: 'DEFAULT_REMINDER_NOTE',
+    APPOINTMENT_LOCATION: 'DEFAULT_APPOINTMENT_LOCATION',
+}
+
+
+@dataclass(frozen=True)
+class SettingsSnapshot:
+    """Active values of all settings at one point in time"""
+    values: Mapping[str, str]
+
+    def get(self, key: str, default: Optional[str] = None) -> Optional[str]:
+        if key in self.values:
+            return self.values[key]
+
+        if default is not None:
+            return default
+
+        if key in DEFAULTS:
+            return getattr(settings, DEFAULTS[key])
+
+        return None
+
+    @property
+    def sender(self) -> str:
+        return self.get(SENDER)
+
+    @property
+    def mailing_list(self) -> str:
+        return self.get(MAILING_LIST)
+
+    @property
+    def reminder_note(self) -> str:
+        return self.get(REMINDER_NOTE)
+
+    @property
+    def appointment_location(self) -> str:
+        return self.get(APPOINTMENT_LOCATION)
+
+
+_local: Tuple[Optional[tuple], Optional[SettingsSnapshot]] = (None, None)
+
+
+def _load() -> dict:
+    values = {}
+    # the first active value wins, just like Settings.objects.filter(...).first()
+    rows = apps.get_model('management', 'Settings').objects.filter(active=True).order_by('-pk')
+    for name, value in rows.values_list('name', 'value'):
+        values[name] = value
+    return values
+
+
+def snapshot() -> SettingsSnapshot:
+    """
+    Return the current settings. They are loaded from the database once per
+    change, which every process notices by the modification stamp of the
+    settings table.
+    """
+    global _local  # pylint: disable=global-statement
+    version = apps.get_model('management', 'Modification').stamps(apps.get_model('management', 'Settings'))
+    local_version, local_snapshot = _local
+    if local_snapshot is not None and local_version == version:
+        return local_snapshot
+
+    local_snapshot = SettingsSnapshot(MappingProxyType(_load()))
+    _local = (version, local_snapshot)
+    return local_snapshot
@@ -0,0 +1,309 @@
+from typing import Iterable, List
+
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete, pre_save
+from django.dispatch import Signal, receiver
+from django.utils import timezone
+
+from management.caching import invalidate_all_icals, invalidate_ical, invalidate_plan
+from management.events import broadcaster
+from management.models import Admin, Appointment, Change, HSemester, Modification, Settings
+
+# bulk_create does not send post_save, send this one instead
+appointments_created = Signal()
+
+# fields that show up in the calendar entry of an appointment
+CALENDAR_FIELDS = {'start_time', 'end_time'}
+
+
+def _admins_of(appointment_pks: Iterable[int]) -> List[int]:
+    return list(Admin.objects.filter(appointments__in=appointment_pks).values_list('pk', flat=True).distinct())
+
+
+def _co_admins(admin: Admin) -> List[int]:
+    """the admin and everybody sharing an appointment with them, i.e. all feeds listing them as attendee"""
+    return list(Admin.objects.filter(appointments__admins=admin).values_list('pk', flat=True).distinct()) + [admin.pk]
+
+
+@receiver(post_save, sender=Appointment)
+@receiver(post_delete, sender=Appointment)
+@receiver(post_save, sender=Admin)
+@receiver(post_delete, sender=Admin)
+@receiver(post_save, sender=Settings)
+@receiver(post_delete, sender=Settings)
+@receiver(post_save, sender=HSemester)
+@receiver(post_delete, sender=HSemester)
+def touch_table(sender, **kwargs):
+    Modification.touch(sender)
+
+
+@receiver(m2m_changed, sender=Appointment.admins.through)
+def touch_appointment_admins(sender, action, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        Modification.touch(sender)
+
+
+@receiver(appointments_created)
+def touch_appointments(sender, **kwargs):
+    Modification.touch(Appointment)
+
+
+@receiver(pre_save, sender=Appointment)
+def remember_calendar_times(sender, instance, update_fields, **kwargs):
+    """Note whether the calendar entry changes, Appointment.save writes all fields, so compare the stored times"""
+    instance.calendar_changed = instance._state.adding
+    if instance._state.adding or (update_fields is not None and not CALENDAR_FIELDS & set(update_fields)):
+        return
+
+    previous = sender.objects.filter(pk=instance.pk).values_list('start_time', 'end_time').first()
+    # a moved appointment also disappears from the plan of its former month
+    instance.previous_start_time = previous[0] if previous else None
+    instance.calendar_changed = previous != (instance.start_time, instance.end_time)
+
+
+@receiver(pre_save, sender=Appointment)
+def bump_sequence(sender, instance, **kwargs):
+    # sent after remember_calendar_times
+    if not instance._state.adding and instance.calendar_changed:
+        instance.sequence += 1
+        instance.updated_at = timezone.now()
+
+
+@receiver(post_save, sender=Admin)
+def touch_admin_appointments(sender, instance, created, **kwargs):
+    # the name of the admin is part of the calendar entries
+    if not created:
+        Appointment.touch(instance.appointments.values('pk'))
+
+
+@receiver(m2m_changed, sender=Appointment.admins.through)
+def touch_staffed_appointments(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == 'pre_clear' and reverse:
+        instance.cleared_appointment_pks = list(instance.appointments.values_list('pk', flat=True))
+    elif action == 'post_clear':
+        Appointment.touch(instance.cleared_appointment_pks if reverse else [instance.pk])
+    elif action in ('post_add', 'post_remove'):
+        Appointment.touch(pk_set if reverse else [instance.pk])
+
+
+@receiver(pre_delete, sender=Appointment)
+def remember_appointment_admins(sender, instance, **kwargs):
+    # the m2m rows are gone by the time post_delete is sent
+    instance.ical_admin_pks = _admins_of([instance.pk])
+
+
+@receiver(pre_delete, sender=Admin)
+def remember_co_admins(sender, instance, **kwargs):
+    instance.ical_admin_pks = _co_admins(instance)
+    instance.appointment_pks = list(instance.appointments.values_list('pk', flat=True))
+
+
+@receiver(post_delete, sender=Admin)
+def touch_former_appointments(sender, instance, **kwargs):
+    Appointment.touch(instance.appointment_pks)
+
+
+@receiver(m2m_changed, sender=Appointment.admins.through)
+def count_admins(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if reverse:
+        # remembered by touch_staffed_appointments
+        Appointment.update_admin_counts(instance.cleared_appointment_pks if action == 'post_clear' else pk_set)
+    else:
+        Appointment.update_admin_counts([instance.pk])
+        # a later save() of the instance must not write back the old count
+        instance.admin_count = Appointment.objects.values_list('admin_count', flat=True).get(pk=instance.pk)
+
+
+@receiver(post_delete, sender=Admin)
+def count_former_admins(sender, instance, **kwargs):
+    # the staffing rows are deleted along with the admin, remembered by remember_co_admins
+    Appointment.update_admin_counts(instance.appointment_pks)
+
+
+@receiver(post_save, sender=Appointment)
+def invalidate_appointment_icals(sender, instance, **kwargs):
+    if instance.calendar_changed:
+        invalidate_ical(_admins_of([instance.pk]), full_calendar=True)
+
+
+@receiver(post_delete, sender=Appointment)
+def invalidate_deleted_appointment_icals(sender, instance, **kwargs):
+    invalidate_ical(instance.ical_admin_pks, full_calendar=True)
+
+
+@receiver(appointments_created)
+def invalidate_full_ical(sender, **kwargs):
+    invalidate_ical(full_calendar=True)
+
+
+@receiver(post_save, sender=Admin)
+def invalidate_admin_icals(sender, instance, **kwargs):
+    # the full calendar does not list attendees
+    invalidate_ical(_co_admins(instance))
+
+
+@receiver(post_delete, sender=Admin)
+def invalidate_deleted_admin_icals(sender, instance, **kwargs):
+    invalidate_ical(instance.ical_admin_pks)
+
+
+@receiver(m2m_changed, sender=Appointment.admins.through)
+def invalidate_attendee_icals(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == 'pre_clear':
+        instance.ical_admin_pks = _co_admins(instance) if reverse else _admins_of([instance.pk])
+        return
+
+    if action == 'post_clear':
+        invalidate_ical(instance.ical_admin_pks)
+        return
+
+    if action not in ('post_add', 'post_remove'):
+        return
+
+    if reverse:
+        # instance is an admin, pk_set are appointments
+        invalidate_ical(_admins_of(pk_set) + [instance.pk])
+    else:
+        # removed admins are no longer related to the appointment but their feeds changed as well
+        invalidate_ical(_admins_of([instance.pk]) + list(pk_set))
+
+
+@receiver(post_save, sender=Settings)
+@receiver(post_delete, sender=Settings)
+def invalidate_icals(sender, **kwargs):
+    # the location is part of every feed
+    invalidate_all_icals()
+
+
+@receiver(post_save, sender=Appointment)
+def invalidate_appointment_plan(sender, instance, **kwargs):
+    if instance.calendar_changed:
+        invalidate_plan([instance.start_time, getattr(instance, 'previous_start_time', None)])
+
+
+@receiver(post_delete, sender=Appointment)
+def invalidate_deleted_appointment_plan(sender, instance, **kwargs):
+    invalidate_plan([instance.start_time])
+
+
+@receiver(appointments_created)
+def invalidate_created_appointments_plan(sender, appointments, **kwargs):
+    invalidate_plan(appointment.start_time for appointment in appointments)
+
+
+@receiver(post_save, sender=Admin)
+def invalidate_admin_plan(sender, instance, created, **kwargs):
+    # admins are listed with name and email
+    if not created:
+        invalidate_plan(instance.appointments.values_list('start_time', flat=True))
+
+
+@receiver(pre_delete, sender=Admin)
+def remember_start_times(sender, instance, **kwargs):
+    instance.plan_start_times = list(instance.appointments.values_list('start_time', flat=True))
+
+
+@receiver(post_delete, sender=Admin)
+def invalidate_deleted_admin_plan(sender, instance, **kwargs):
+    invalidate_plan(instance.plan_start_times)
+
+
+@receiver(m2m_changed, sender=Appointment.admins.through)
+def invalidate_staffing_plan(sender, instance, action, reverse, pk_set, **kwargs):
+    if not reverse:
+        # instance is an appointment
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            invalidate_plan([instance.start_time])
+    elif action == 'pre_clear':
+        instance.plan_start_times = list(instance.appointments.values_list('start_time', flat=True))
+    elif action == 'post_clear':
+        invalidate_plan(instance.plan_start_times)
+    elif action in ('post_add', 'post_remove'):
+        invalidate_plan(Appointment.objects.filter(pk__in=pk_set).values_list('start_time', flat=True))
+
+
+def _log(*changes: Change):
+    Change.objects.bulk_create(changes)
+    transaction.on_commit(lambda: broadcaster().publish(changes))
+
+
+def _appointment_data(appointment: Appointment) -> dict:
+    # same format as appointments.json
+    return {'start': appointment.start_time.timestamp(), 'end': appointment.end_time.timestamp()}
+
+
+@receiver(post_save, sender=Appointment)
+def log_appointment(sender, instance, created, **kwargs):
+    if created:
+        _log(Change(kind=Change.APPOINTMENT, action=Change.CREATED, object_id=instance.pk,
+                    data=_appointment_data(instance)))
+    elif instance.calendar_changed:
+        _log(Change(kind=Change.APPOINTMENT, action=Change.UPDATED, object_id=instance.pk,
+                    data=_appointment_data(instance)))
+
+
+@receiver(appointments_created)
+def log_created_appointments(sender, appointments, **kwargs):
+    # only the inserted appointments are sent, but without pks, so look them up
+    created = Appointment.objects.filter(start_time__in=[appointment.start_time for appointment in appointments])
+    _log(*[
+        Change(kind=Change.APPOINTMENT, action=Change.CREATED, object_id=appointment.pk,
+               data=_appointment_data(appointment))
+        for appointment in created
+    ])
+
+
+@receiver(post_delete, sender=Appointment)
+def log_deleted_appointment(sender, instance, **kwargs):
+    # the staffing rows are deleted along with the appointment, remembered by remember_appointment_admins
+    _log(*[
+        Change(kind=Change.STAFFING, action=Change.DELETED, object_id=instance.pk, related_id=admin_pk)
+        for admin_pk in instance.ical_admin_pks
+    ], Change(kind=Change.APPOINTMENT, action=Change.DELETED, object_id=instance.pk))
+
+
+@receiver(post_save, sender=Admin)
+def log_admin(sender, instance, created, **kwargs):
+    # the email address is not public
+    _log(Change(kind=Change.ADMIN, action=Change.CREATED if created else Change.UPDATED, object_id=instance.pk,
+                data={'name': instance.name}))
+
+
+@receiver(post_delete, sender=Admin)
+def log_deleted_admin(sender, instance, **kwargs):
+    # remembered by remember_co_admins
+    _log(*[
+        Change(kind=Change.STAFFING, action=Change.DELETED, object_id=appointment_pk, related_id=instance.pk)
+        for appointment_pk in instance.appointment_pks
+    ], Change(kind=Change.ADMIN, action=Change.DELETED, object_id=instance.pk))
+
+
+@receiver(post_save, sender=HSemester)
+def log_h_semester(sender, instance, created, **kwargs):
+    _log(Change(kind=Change.H_SEMESTER, action=Change.CREATED if created else Change.UPDATED, object_id=instance.pk,
+                data={'admin': instance.admin_id, 'date': instance.date.isoformat()}))
+
+
+@receiver(post_delete, sender=HSemester)
+def log_deleted_h_semester(sender, instance, **kwargs):
+    _log(Change(kind=Change.H_SEMESTER, action=Change.DELETED, object_id=instance.pk))
+
+
+@receiver(m2m_changed, sender=Appointment.admins.through)
+def log_staffing(sender, instance, action, reverse, pk_set, **kwargs):
+    if action in ('post_add', 'post_remove'):
+        pairs = [(pk, instance.pk) if reverse else (instance.pk, pk) for pk in pk_set]
+    elif action == 'post_clear':
+        # remembered by touch_staffed_appointments and invalidate_attendee_icals
+        pairs = [(pk, instance.pk) for pk in instance.cleared_appointment_pks] if reverse else \
+            [(instance.pk, pk) for pk in instance.ical_admin_pks]
+    else:
+        return
+
+    change_action = Change.CREATED if action == 'post_add' else Change.DELETED
+    _log(*[
+        Change(kind=Change.STAFFING, action=change_action, object_id=appointment_pk, related_id=admin_pk)
+        for appointment_pk, admin_pk in pairs
+    ])
@@ -0,0 +1,82 @@
+import csv
+import json
+from datetime import date, datetime
+from typing import Iterable, Iterator, Optional
+
+from django.conf import settings
+from django.db.models import Case, Count, F, QuerySet, Value, When
+from django.db.models.functions import ExtractDay, ExtractMonth, ExtractYear
+
+from management.models import Appointment
+from management.utils import academic_period, academic_period_name
+
+FIELDS = ['period_start', 'period', 'lecture_time', 'admin_id', 'first_name', 'last_name', 'appointments']
+
+
+def _period_start():
+    """
+    First day of the academic period as year * 10000 + month * 100 + day,
+    evaluated in the database. Days before the first period of a year
+    belong to the last one of the year before.
+    """
+    year = F('year') * 10000
+    starts = [month * 100 + day for month, day, _, _ in settings.ACADEMIC_PERIODS]
+    whens = [When(month_day__lt=starts[0], then=year - 10000 + starts[-1])]
+    whens += [When(month_day__lt=end, then=year + start) for start, end in zip(starts, starts[1:])]
+    return Case(*whens, default=year + Value(starts[-1]))
+
+
+def semester_breakdown(from_datetime: Optional[datetime] = None, to_datetime: Optional[datetime] = None) -> QuerySet:
+    """Number of appointments per admin and academic period, grouped in one query"""
+    staffing = Appointment.admins.through.objects.all()
+    if from_datetime:
+        staffing = staffing.filter(appointment__start_time__gte=from_datetime)
+    if to_datetime:
+        staffing = staffing.filter(appointment__end_time__lte=to_datetime)
+
+    return staffing.annotate(
+        year=ExtractYear('appointment__start_time'),
+        month_day=ExtractMonth('appointment__start_time') * 100 + ExtractDay('appointment__start_time'),
+    ).annotate(
+        period_start=_period_start(),
+    ).values(
+        'period_start', 'admin_id', 'admin__first_name', 'admin__last_name',
+    ).annotate(
+        appointments=Count('pk'),
+    ).order_by('period_start', 'admin__last_name', 'admin__first_name')
+
+
+def semester_rows(breakdown: QuerySet) -> Iterator[dict]:
+    for row in breakdown.iterator():
+        start = date(row['period_start'] // 10000, row['period_start'] // 100 % 100, row['period_start'] % 100)
+        yield {
+            'period_start': start.isoformat(),
+            'period': academic_period_name(start),
+            'lecture_time': academic_period(start)[1],
+            'admin_id': row['admin_id'],
+            'first_name': row['admin__first_name'],
+            'last_name': row['admin__last_name'],
+            'appointments': row['appointments'],
+        }
+
+
+class _Echo:
+    """File-like object handing written lines back to the caller"""
+
+    def write(self, value):
+        return value
+
+
+def iter_csv(rows: Iterable[dict]) -> Iterator[str]:
+    writer = csv.DictWriter(_Echo(), fieldnames=FIELDS)
+    yield writer.writeheader()
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def iter_json(rows: Iterable[dict]) -> Iterator[str]:
+    separator = '[\n'
+    for row in rows:
+        yield separator + json.dumps(row)
+        separator = ',\n'
+    yield '[]\n' if separator == '[\n' else '\n]\n'
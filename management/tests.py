@@ -0,0 +1,134 @@
+import threading
+from datetime import timedelta
+from io import StringIO
+from unittest import skipUnless
+
+from django.conf import settings
+from django.core import mail
+from django.core.mail import EmailMessage
+from django.core.mail.backends.locmem import EmailBackend
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from management.models import Admin, Appointment, HSemester, OutgoingMail, Settings
+
+
+class CountingBackend(EmailBackend):
+    """Stands in for the SMTP server, counts the connections opened and the threads sending over them"""
+    lock = threading.Lock()
+    connections = 0
+    threads: set = set()
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.connected = False
+
+    @classmethod
+    def reset(cls):
+        cls.connections = 0
+        cls.threads = set()
+
+    def open(self):
+        # like the SMTP backend, an open connection is reused
+        if self.connected:
+            return False
+        with self.lock:
+            CountingBackend.connections += 1
+        self.connected = True
+        return True
+
+    def close(self):
+        self.connected = False
+
+    def send_messages(self, messages):
+        with self.lock:
+            CountingBackend.threads.add(threading.get_ident())
+            return super().send_messages(messages)
+
+
+@override_settings(EMAIL_BACKEND='management.tests.CountingBackend')
+class DeliverMailTest(TestCase):
+    def setUp(self):
+        CountingBackend.reset()
+
+    @staticmethod
+    def enqueue(count: int):
+        OutgoingMail.enqueue(
+            EmailMessage(f'Mail {i}', 'Text', 'no-reply@example.org', [f'admin{i}@example.org']) for i in range(count))
+
+    def deliver(self, **options):
+        call_command('deliver_mail', stdout=StringIO(), stderr=StringIO(), **options)
+
+    def test_one_connection_for_all_batches(self):
+        self.enqueue(10)
+        self.deliver(workers=1, batch_size=3)
+
+        self.assertEqual(len(mail.outbox), 10)
+        self.assertEqual(CountingBackend.connections, 1)
+        self.assertFalse(OutgoingMail.objects.exclude(state=OutgoingMail.SENT).exists())
+
+    def test_one_connection_per_worker_thread(self):
+        self.enqueue(20)
+        self.deliver(workers=3, batch_size=5)
+
+        self.assertEqual(len(mail.outbox), 20)
+        self.assertEqual(sorted(message.subject for message in mail.outbox), sorted(f'Mail {i}' for i in range(20)))
+        self.assertLessEqual(len(CountingBackend.threads), 3)
+        self.assertEqual(CountingBackend.connections, len(CountingBackend.threads))
+
+    def test_notification_run_over_one_connection(self):
+        start_time = timezone.now() + timedelta(hours=3)
+        appointment = Appointment.objects.create(start_time=start_time, end_time=start_time + timedelta(minutes=30))
+        appointment.admins.set([
+            Admin.objects.create(first_name='Erika', last_name='Mustermann', email='erika@example.org'),
+            Admin.objects.create(first_name='Max', last_name='Mustermann', email='max@example.org'),
+        ])
+
+        call_command('send_notifications', stdout=StringIO())
+        self.assertEqual(len(mail.outbox), 0)
+        self.deliver(workers=1)
+
+        recipients = [recipient for message in mail.outbox for recipient in message.to]
+        self.assertIn('erika@example.org', recipients)
+        self.assertIn('max@example.org', recipients)
+        self.assertEqual(CountingBackend.connections, 1)
+
+
+def hot_queries():
+    """The frequent filters that must be served by an index, by description"""
+    now = timezone.now()
+    return {
+        'appointments of a month (plan, iCal)':
+            Appointment.objects.filter(start_time__gte=now, start_time__lt=now + timedelta(days=31)),
+        'upcoming appointments (API)': Appointment.objects.filter(start_time__gte=now),
+        'pending reminders (process_reminders)':
+            Appointment.objects.filter(reminder_sent=False, start_time__gt=now, end_time__lte=now + timedelta(days=1)),
+        'understaffed appointments': Appointment.objects.filter(
+            admin_count__lt=settings.APPOINTMENT_UNDERSTAFFED_THRESHOLD, start_time__gte=now),
+        'setting by name (settings form)': Settings.objects.filter(name=Settings.SETTING_SENDER),
+        'active setting by name': Settings.objects.filter(name=Settings.SETTING_SENDER, active=True),
+        'honorary semesters of an admin': HSemester.objects.filter(admin_id=1).order_by('date'),
+        'honorary semesters of an admin up to a date':
+            HSemester.objects.filter(admin_id=1, date__lte=now.date()),
+        'due mails (deliver_mail)': OutgoingMail.due(now),
+    }
+
+
+def full_scans(queryset) -> list:
+    """Steps of the SQLite query plan that read a whole table without an index"""
+    sql, params = queryset.query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+        details = [row[-1] for row in cursor.fetchall()]
+    # e.g. "SCAN management_appointment", but not "SCAN management_appointment USING INDEX ..."
+    return [detail for detail in details if detail.startswith('SCAN') and 'USING' not in detail]
+
+
+@skipUnless(connection.vendor == 'sqlite', 'EXPLAIN QUERY PLAN is only checked on SQLite')
+class QueryPlanTest(TestCase):
+    def test_hot_queries_use_an_index(self):
+        for description, queryset in hot_queries().items():
+            with self.subTest(description):
+                self.assertEqual(full_scans(queryset), [])
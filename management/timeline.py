@@ -0,0 +1,189 @@
+import threading
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import defaultdict
+from datetime import date, datetime
+from typing import Dict, Iterable, Optional, Set, Tuple
+
+from dateutil import tz
+from django.apps import apps
+from django.conf import settings
+from django.db.models import Max
+
+
+def _end_of_day(d: date) -> float:
+    return datetime.combine(d, datetime.max.time(), tzinfo=tz.gettz(settings.TIME_ZONE)).timestamp()
+
+
+class AdminTimeline:
+    """
+    Sorted appointment times and honorary semester dates of one admin, so that
+    all statistics as of a given date are binary searches.
+    """
+    __slots__ = ('starts', 'ends', 'h_semesters')
+
+    def __init__(self, starts: Iterable[float] = (), ends: Iterable[float] = (), h_semesters: Iterable[int] = ()):
+        # timestamps and date ordinals keep this compact
+        self.starts = array('d', sorted(starts))
+        self.ends = array('d', sorted(ends))
+        self.h_semesters = array('l', sorted(h_semesters))
+
+    def appointment_count(self, until: Optional[datetime] = None) -> int:
+        if until is None:
+            return len(self.ends)
+        return bisect_right(self.ends, until.timestamp())
+
+    def h_semester_count(self, end_date: Optional[date] = None) -> int:
+        if end_date is None:
+            return len(self.h_semesters)
+        return bisect_right(self.h_semesters, end_date.toordinal())
+
+    def last_h_semester(self, end_date: Optional[date] = None) -> Optional[date]:
+        count = self.h_semester_count(end_date)
+        return date.fromordinal(self.h_semesters[count - 1]) if count else None
+
+    def appointments_since_last_h_semester(self, end_date: Optional[date] = None) -> int:
+        last_h_semester = self.last_h_semester(end_date)
+        # appointments on the day of the honorary semester count to this very semester
+        first = bisect_left(self.starts, _end_of_day(last_h_semester)) if last_h_semester else 0
+        last = bisect_right(self.starts, _end_of_day(end_date)) if end_date else len(self.starts)
+        return max(0, last - first)
+
+
+def _version() -> tuple:
+    appointment = apps.get_model('management', 'Appointment')
+    # deleting an admin removes their staffing rows without touching the staffing table
+    return apps.get_model('management', 'Modification').stamps(
+        appointment, appointment.admins.through, apps.get_model('management', 'Admin'),
+        apps.get_model('management', 'HSemester'))
+
+
+class TimelineIndex:
+    """
+    Timelines of all admins, loaded once per process. Every process notices
+    changes, whichever process made them, by the modification stamps of the
+    tables they are built from, and applies them from the change log to the
+    affected admins only. It reloads everything if its cursor expired.
+    """
+
+    def __init__(self):
+        self._timelines: Optional[Dict[int, AdminTimeline]] = None
+        self._version: Optional[tuple] = None
+        self._lock = threading.Lock()
+        # last change applied, and the compaction generation it was read in
+        self._cursor = 0
+        self._generation = 0
+        # what the timelines are built from: appointment -> (start, end), appointment -> admins,
+        # admin -> appointments, honorary semester -> (admin, date ordinal), admin -> honorary semesters
+        self._appointments: Dict[int, Tuple[float, float]] = {}
+        self._staffing: Dict[int, Set[int]] = defaultdict(set)
+        self._admin_appointments: Dict[int, Set[int]] = defaultdict(set)
+        self._h_semesters: Dict[int, Tuple[int, int]] = {}
+        self._admin_h_semesters: Dict[int, Set[int]] = defaultdict(set)
+
+    def _timeline(self, admin_pk: int) -> Optional[AdminTimeline]:
+        appointments = [self._appointments[pk] for pk in self._admin_appointments.get(admin_pk, ())]
+        h_semesters = [self._h_semesters[pk][1] for pk in self._admin_h_semesters.get(admin_pk, ())]
+        if not appointments and not h_semesters:
+            return None
+        return AdminTimeline((start for start, _ in appointments), (end for _, end in appointments), h_semesters)
+
+    def _staff(self, appointment_pk: int, admin_pk: int, staffed: bool):
+        if staffed:
+            self._staffing[appointment_pk].add(admin_pk)
+            self._admin_appointments[admin_pk].add(appointment_pk)
+        else:
+            self._staffing[appointment_pk].discard(admin_pk)
+            self._admin_appointments[admin_pk].discard(appointment_pk)
+
+    def _set_h_semester(self, pk: int, h_semester: Optional[Tuple[int, int]]) -> Set[int]:
+        """Set or remove an honorary semester, return the admins affected"""
+        affected = set()
+        previous = self._h_semesters.pop(pk, None)
+        if previous is not None:
+            self._admin_h_semesters[previous[0]].discard(pk)
+            affected.add(previous[0])
+        if h_semester is not None:
+            self._h_semesters[pk] = h_semester
+            self._admin_h_semesters[h_semester[0]].add(pk)
+            affected.add(h_semester[0])
+        return affected
+
+    def _load(self):
+        change = apps.get_model('management', 'Change')
+        appointment = apps.get_model('management', 'Appointment')
+        # changes after the cursor may already be loaded, applying them once more does not change anything
+        self._generation = change.generation()
+        self._cursor = change.objects.aggregate(cursor=Max('pk'))['cursor'] or 0
+
+        self._appointments = {
+            pk: (start_time.timestamp(), end_time.timestamp())
+            for pk, start_time, end_time in appointment.objects.values_list('pk', 'start_time', 'end_time').iterator()
+        }
+        self._staffing, self._admin_appointments = defaultdict(set), defaultdict(set)
+        for appointment_pk, admin_pk in appointment.admins.through.objects.values_list(
+                'appointment_id', 'admin_id').iterator():
+            self._staff(appointment_pk, admin_pk, True)
+        self._h_semesters, self._admin_h_semesters = {}, defaultdict(set)
+        for pk, admin_pk, h_semester_date in apps.get_model('management', 'HSemester').objects.values_list(
+                'pk', 'admin_id', 'date').iterator():
+            self._set_h_semester(pk, (admin_pk, h_semester_date.toordinal()))
+
+        timelines = {admin_pk: self._timeline(admin_pk)
+                     for admin_pk in set(self._admin_appointments) | set(self._admin_h_semesters)}
+        self._timelines = {admin_pk: timeline for admin_pk, timeline in timelines.items() if timeline}
+
+    def _apply_changes(self) -> bool:
+        """Apply the changes since the cursor to the affected admins, False if they have to be reloaded"""
+        change = apps.get_model('management', 'Change')
+        if change.cursor_expired(self._cursor, self._generation):
+            return False
+
+        affected = set()
+        changes = change.objects.filter(pk__gt=self._cursor).exclude(kind=change.ADMIN).values_list(
+            'pk', 'kind', 'action', 'object_id', 'related_id', 'data')
+        for pk, kind, action, object_id, related_id, data in changes.iterator():
+            if kind == change.APPOINTMENT:
+                if action == change.DELETED:
+                    self._appointments.pop(object_id, None)
+                else:
+                    self._appointments[object_id] = (data['start'], data['end'])
+                # the staffing rows of a deleted appointment are logged as deleted before
+                affected |= self._staffing.get(object_id, set())
+            elif kind == change.STAFFING:
+                if action == change.CREATED and object_id not in self._appointments:
+                    return False
+                self._staff(object_id, related_id, action == change.CREATED)
+                affected.add(related_id)
+            elif kind == change.H_SEMESTER:
+                h_semester = None
+                if action != change.DELETED:
+                    h_semester = (data['admin'], date.fromisoformat(data['date']).toordinal())
+                affected |= self._set_h_semester(object_id, h_semester)
+            self._cursor = pk
+
+        # readers keep the dict they got, so replace it instead of changing it
+        timelines = dict(self._timelines)
+        for admin_pk in affected:
+            timeline = self._timeline(admin_pk)
+            if timeline:
+                timelines[admin_pk] = timeline
+            else:
+                timelines.pop(admin_pk, None)
+        self._timelines = timelines
+        return True
+
+    def all(self) -> Dict[int, AdminTimeline]:
+        version = _version()
+        with self._lock:
+            if self._timelines is None or (self._version != version and not self._apply_changes()):
+                self._load()
+            # a change committed meanwhile is applied too, and looked for once more on the next access
+            self._version = version
+            return self._timelines
+
+    def get(self, admin_pk: int) -> AdminTimeline:
+        return self.all().get(admin_pk) or AdminTimeline()
+
+
+timelines = TimelineIndex()
@@ -9,11 +9,16 @@ urlpatterns = [
     path('', views.plan, name='index'),
     path('settings', views.app_settings, name='settings'),
     path('statistics', views.statistics, name='statistics'),
+    path('statistics/semesters.csv', views.statistics_semesters, {'export_format': 'csv'},
+         name='statistics_semesters_csv'),
+    path('statistics/semesters.json', views.statistics_semesters, {'export_format': 'json'},
+         name='statistics_semesters_json'),
 
     # admins
     path('admins', views.manage_admins, name='manage_admins'),
     path('admins/<int:pk>/edit', views.edit_admin, name='edit_admin'),
     path('admins/<int:pk>/appointments.ical', views.admin_calendar, name='admin_calendar'),
+    path('admins/<int:pk>/archive.ical', views.admin_calendar_archive, name='admin_calendar_archive'),
     path('admins/create', views.create_admin, name='create_admin'),
     path('admins/<int:pk>/delete', views.delete_admin, name='delete_admin'),
 
@@ -25,11 +30,15 @@ urlpatterns = [
     # ical calendar stuff
     path('calendar', views.calendar, name='calendar'),
     path('calendar/all.ical', views.full_calendar, name='full_calendar'),
+    path('calendar/archive.ical', views.full_calendar_archive, name='full_calendar_archive'),
     path('calendar/<int:pk>.ical', views.admin_calendar, name='admin_calendar_old'),
 
     # api stuff
     path('persons.json', views.api_list_admins, name='api_list_admins'),
+    path('persons/search.json', views.api_search_admins, name='api_search_admins'),
     path('appointments.json', views.api_list_appointments, name='api_list_appointments'),
+    path('changes.json', views.api_list_changes, name='api_list_changes'),
+    path('events', views.plan_events, name='plan_events'),
 
     # authentication stuff
     path('auth/login/', auth_views.LoginView.as_view(), name='login'),
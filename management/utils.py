@@ -1,6 +1,8 @@
-import math
-from datetime import date, datetime
-from typing import Tuple
+import unicodedata
+from array import array
+from datetime import date, datetime, timedelta
+from functools import lru_cache
+from typing import Dict, List, Tuple
 
 from dateutil import tz
 from dateutil.easter import easter
@@ -17,56 +19,101 @@ def datetime_plus_months(d: date, months: int):
                     tzinfo=tz.gettz(settings.TIME_ZONE))
 
 
+# letters that unicode does not decompose into a base letter and a diacritic
+LETTER_TRANSLATION = str.maketrans({'ø': 'o', 'ł': 'l', 'đ': 'd', 'ð': 'd', 'þ': 'th', 'æ': 'ae', 'œ': 'oe'})
+
+
+def normalize_name(name: str) -> str:
+    """lower case without diacritics, e.g. for searching 'Jürgen' as 'jurgen'"""
+    decomposed = unicodedata.normalize('NFKD', name.casefold().translate(LETTER_TRANSLATION))
+    return ' '.join(''.join(c for c in decomposed if not unicodedata.combining(c)).split())
+
+
+def prefix_range(prefix: str) -> Tuple[str, str]:
+    """bounds of all strings starting with `prefix`, as a range query can use an index unlike LIKE"""
+    return prefix, prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+
+FIXED_HOLIDAYS = [
+    (5, 1, 'Tag der Arbeit'),
+    (8, 15, 'Maria Himmerlfahrt'),
+    (10, 3, 'Tag der Deutschen Einheit'),
+    (11, 1, 'Allerheiligen'),
+] + [(12, day, 'Weihnachten') for day in range(24, 32)] + [(1, day, 'Weihnachten') for day in range(1, 7)]
+
+# Feiertage abhaengig von Ostern, als Abstand in Tagen zum Ostersonntag
+EASTER_HOLIDAYS = [
+    (-2, 'Karfreitag'),
+    (0, 'Ostersonntag'),
+    (1, 'Ostermontag'),
+    (39, 'Christi Himmelfahrt'),
+    (49, 'Pfingstsonntag'),
+    (50, 'Pfingstmontag'),
+    (60, 'Fronleichnam'),
+]
+
+
+class AcademicYear:
+    """
+    Holidays and academic periods of one calendar year, precomputed so that
+    looking up a date is a dict or list access.
+    """
+
+    def __init__(self, year: int, periods: List[Tuple[int, int, bool, str]]):
+        self.year = year
+
+        holidays = {easter(year) + timedelta(days=offset): label for offset, label in EASTER_HOLIDAYS}
+        # feste Feiertage haben Vorrang
+        holidays.update({date(year, month, day): label for month, day, label in FIXED_HOLIDAYS})
+        self.holidays: Dict[date, str] = holidays
+
+        # the last period of the previous year lasts until the first one of this year starts
+        month, day, lecture_time, label = periods[-1]
+        self.periods: List[Tuple[date, bool, str]] = [(date(year - 1, month, day), lecture_time, label)]
+        self.periods += [(date(year, month, day), lecture_time, label) for month, day, lecture_time, label in periods]
+
+        self._first_day = date(year, 1, 1).toordinal()
+        self._period_of_day = array('B')
+        index = 0
+        for day in range(self._first_day, date(year + 1, 1, 1).toordinal()):
+            while index + 1 < len(self.periods) and self.periods[index + 1][0].toordinal() <= day:
+                index += 1
+            self._period_of_day.append(index)
+
+    def holiday(self, d: date) -> Tuple[bool, str]:
+        label = self.holidays.get(d)
+        return (True, label) if label else (False, '')
+
+    def period(self, d: date) -> Tuple[date, bool, str]:
+        return self.periods[self._period_of_day[d.toordinal() - self._first_day]]
+
+    def period_name(self, start: date) -> str:
+        _, _, label = self.period(start)
+        if start == self.periods[-1][0]:
+            # lasts into the next year
+            return f'{label} {start.year}/{(start.year + 1) % 100:02d}'
+        return f'{label} {start.year}'
+
+
+@lru_cache(maxsize=None)
+def academic_year(year: int) -> AcademicYear:
+    return AcademicYear(year, settings.ACADEMIC_PERIODS)
+
+
 def is_holiday(d: date) -> Tuple[bool, str]:
-    # feste Feiertage
-    if d.month == 5 and d.day == 1:
-        return True, 'Tag der Arbeit'
-    if d.month == 8 and d.day == 15:
-        return True, 'Maria Himmerlfahrt'
-    if d.month == 10 and d.day == 3:
-        return True, 'Tag der Deutschen Einheit'
-    if d.month == 11 and d.day == 1:
-        return True, 'Allerheiligen'
-    if (d.month == 12 and d.day >= 24) or (d.month == 1 and d.day <= 6):
-        return True, 'Weihnachten'
-
-    # Feiertage abhaengig von Ostern
-    diff = d - easter(d.year)
-    day_diff = int(math.floor(diff.total_seconds() / 86400))
-
-    if day_diff == -2:
-        return True, 'Karfreitag'
-    if day_diff == 0:
-        return True, 'Ostersonntag'
-    if day_diff == 1:
-        return True, 'Ostermontag'
-    if day_diff == 39:
-        return True, 'Christi Himmelfahrt'
-    if day_diff == 49:
-        return True, 'Pfingstsonntag'
-    if day_diff == 50:
-        return True, 'Pfingstmontag'
-    if day_diff == 60:
-        return True, 'Fronleichnam'
-
-    return False, ''
+    return academic_year(d.year).holiday(d)
+
+
+def academic_period(d: date) -> Tuple[date, bool, str]:
+    """Return start, lecture time flag and label of the period `d` falls into"""
+    return academic_year(d.year).period(d)
+
+
+def academic_period_name(start: date) -> str:
+    """Name the period starting at `start`, e.g. Wintersemester 2023/24"""
+    return academic_year(start.year).period_name(start)
 
 
 def is_during_lecture_time(d: date) -> Tuple[bool, str]:
-    end_of_ws = date(d.year, 2, 1)
-    start_of_ss = date(d.year, 4, 1)
-    end_of_ss = date(d.year, 8, 1)
-    start_of_ws = date(d.year, 10, 1)
-
-    today = date.today()
-
-    if end_of_ws > today:
-        return True, 'Wintersemester'
-    if start_of_ss > today:
-        return False, 'Vorlesungsfreie Zeit (Winter)'
-    if end_of_ss > today:
-        return True, 'Sommersemester'
-    if start_of_ws > today:
-        return False, 'Vorlesungsfreie Zeit (Sommer)'
-
-    return True, 'Wintersemester'
+    _, lecture_time, label = academic_period(d)
+    return lecture_time, label
@@ -1,21 +1,154 @@
+import hashlib
 import itertools
-from datetime import date, datetime
-
+import json
+import math
+import re
+from bisect import bisect_left, bisect_right
+from datetime import date, datetime, time, timedelta
+from typing import List, Optional, Tuple
+
+from asgiref.sync import sync_to_async
 from dateutil.tz import tz
 from django.conf import settings
 from django.contrib import messages
 from django.contrib.admin.views.decorators import staff_member_required
-from django.db.models import Count, Q
-from django.http import JsonResponse, HttpResponse, HttpResponseForbidden
+from django.core.cache import cache
+from django.core.paginator import Paginator
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import Http404, HttpResponse, JsonResponse, HttpResponseForbidden, StreamingHttpResponse
 from django.shortcuts import render, get_object_or_404, redirect
+from django.template.loader import render_to_string
 from django.urls import reverse
 from django.utils import timezone
+from django.utils.cache import get_conditional_response
+from django.utils.http import quote_etag
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition
 
+from management.caching import ical_cache_key, plan_versions
+from management.events import broadcaster
 from management.forms import AdminForm, AddAppointmentsForm, EditAppointmentForm, SettingsForm
-from management.models import Settings, Appointment, Admin
+from management.models import Settings, Appointment, Admin, Change, Modification
+from management.statistics import iter_csv, iter_json, semester_breakdown, semester_rows
+from management.timeline import AdminTimeline, timelines
 from management.utils import datetime_plus_months
 from django.utils.timezone import now
 
+# tables whose modification invalidates the respective feed
+FULL_CALENDAR_TABLES = (Appointment, Settings)
+ADMIN_CALENDAR_TABLES = (Appointment, Appointment.admins.through, Admin, Settings)
+ADMINS_TABLES = (Admin,)
+
+
+def _etag(modified) -> str:
+    return f'{modified.timestamp():.6f}'
+
+
+def _days(value: Optional[str], default: int) -> int:
+    if not value or not value.isdecimal():
+        return default
+    # long numbers are clamped without converting them, int() refuses huge ones
+    if len(value.lstrip('0')) > len(str(settings.ICAL_MAX_DAYS)):
+        return settings.ICAL_MAX_DAYS
+    return min(int(value), settings.ICAL_MAX_DAYS)
+
+
+def _start_of_day(d: date) -> datetime:
+    return datetime.combine(d, time.min, tzinfo=tz.gettz(settings.TIME_ZONE))
+
+
+def ical_window(request) -> Tuple[datetime, datetime]:
+    """Interval of the ical feeds, set by ?past_days= and ?future_days= relative to today"""
+    today = timezone.localdate()
+    past_days = _days(request.GET.get('past_days'), settings.ICAL_DEFAULT_PAST_DAYS)
+    future_days = _days(request.GET.get('future_days'), settings.ICAL_DEFAULT_FUTURE_DAYS)
+    return (_start_of_day(today - timedelta(days=past_days)),
+            _start_of_day(today + timedelta(days=future_days + 1)))
+
+
+def _window_key(window: Tuple[datetime, datetime]) -> str:
+    return f'{window[0]:%Y%m%d}-{window[1]:%Y%m%d}'
+
+
+def feed_last_modified(*tracked_models, windowed: bool = False):
+    def last_modified(request, *args, **kwargs):
+        modified = Modification.last_modified(*tracked_models)
+        if modified and windowed:
+            # the window moves on every midnight
+            modified = max(modified, _start_of_day(timezone.localdate()))
+        return modified
+    return last_modified
+
+
+def feed_etag(*tracked_models, windowed: bool = False):
+    def etag(request, *args, **kwargs):
+        modified = Modification.last_modified(*tracked_models)
+        if not modified:
+            return None
+        if windowed:
+            return f'{_etag(modified)}-{_window_key(ical_window(request))}'
+        return _etag(modified)
+    return etag
+
+
+def _plan_tables(months: List[datetime], end: datetime, versions: List[str], staff: bool,
+                 now: datetime) -> Tuple[List[str], List[float]]:
+    """
+    Render the table of each month starting at `months`, the last one lasts
+    until `end`. Return them and the start times of all their appointments.
+
+    The tables are cached per month, role and version of the month.
+    Appointments that already started are shown muted, so their number is part
+    of the key as well, derived from the cached start times of the month.
+    """
+    role = 'staff' if staff else 'public'
+    prefixes = [f'management:plan:{month:%Y-%m}:{version}' for month, version in zip(months, versions)]
+
+    starts = cache.get_many([f'{prefix}:starts' for prefix in prefixes])
+    keys = [
+        f'{prefix}:{role}:{bisect_left(starts[prefix + ":starts"], now.timestamp())}'
+        if prefix + ':starts' in starts else None
+        for prefix in prefixes
+    ]
+    tables = cache.get_many([key for key in keys if key])
+    if all(key in tables for key in keys):
+        # rendered templates are SafeStrings, which survive the cache
+        return ([tables[key] for key in keys],
+                list(itertools.chain(*[starts[f'{prefix}:starts'] for prefix in prefixes])))
+
+    appointments = [[] for _ in months]
+    for appointment in Appointment.get_in_interval(months[0], end).prefetch_related('admins'):
+        local_start = timezone.localtime(appointment.start_time)
+        index = (local_start.year - months[0].year) * 12 + local_start.month - months[0].month
+        appointments[index].append(appointment)
+
+    rendered = []
+    all_starts = []
+    to_cache = {}
+    for prefix, month, month_appointments in zip(prefixes, months, appointments):
+        month_starts = [appointment.start_time.timestamp() for appointment in month_appointments]
+        table = render_to_string('management/plan_month.html', {
+            'date': month,
+            'appointments': month_appointments,
+            'staff': staff,
+            'today': now,
+        })
+        rendered.append(table)
+        all_starts += month_starts
+        to_cache[f'{prefix}:starts'] = month_starts
+        to_cache[f'{prefix}:{role}:{bisect_left(month_starts, now.timestamp())}'] = table
+    cache.set_many(to_cache, settings.PLAN_CACHE_TIMEOUT)
+
+    return rendered, all_starts
+
+
+def _plan_page_timeout(starts: List[float], now: datetime) -> int:
+    # the page changes when the next appointment starts, as it is shown muted from then on
+    upcoming = bisect_right(starts, now.timestamp())
+    if upcoming < len(starts):
+        return min(settings.PLAN_CACHE_TIMEOUT, math.ceil(starts[upcoming] - now.timestamp()))
+    return settings.PLAN_CACHE_TIMEOUT
+
 
 def plan(request):
     today = timezone.now()
@@ -33,34 +166,36 @@ def plan(request):
         year = today.year
         month = today.month
 
-    from_date = datetime(year=year, month=month, day=1)
-    to_date = datetime_plus_months(from_date, 1)
-
+    # the displayed months plus the ones linked to
+    from_date, second_month, next_date = [datetime_plus_months(date(year, month, 1), i) for i in range(3)]
     previous_date = datetime_plus_months(from_date, -2)
-    next_date = datetime_plus_months(from_date, 2)
+    versions = plan_versions(from_date, second_month)
+
+    # all anonymous visitors get the same page, unless there are messages for them
+    cacheable = not request.user.is_authenticated and not messages.get_messages(request)
+    page_key = f'management:plan-page:{from_date:%Y-%m}:{".".join(versions)}'
+    if cacheable:
+        content = cache.get(page_key)
+        if content is not None:
+            return HttpResponse(content)
 
+    tables, starts = _plan_tables([from_date, second_month], next_date, versions, request.user.is_staff, today)
     context = {
         'from_date': from_date,
-        'to_date': to_date,
+        'to_date': second_month,
         'link_previous': reverse(
             'management:index') + f'?year={previous_date.year}&month={previous_date.month}',
         'link_next': reverse(
             'management:index') + f'?year={next_date.year}&month={next_date.month}',
         'today': today,
-        'plan': [
-            {
-                'date': from_date,
-                'appointments': Appointment.get_in_interval(from_date, datetime_plus_months(from_date, 1))
-            },
-            {
-                'date': datetime_plus_months(from_date, 1),
-                'appointments': Appointment.get_in_interval(datetime_plus_months(from_date, 1),
-                                                            datetime_plus_months(from_date, 2))
-            }
-        ]
+        'plan': [{'date': month_date, 'table': table} for month_date, table in zip((from_date, second_month), tables)],
+        'events': settings.EVENTS_ENABLED,
     }
 
-    return render(request, 'management/plan.html', context)
+    response = render(request, 'management/plan.html', context)
+    if cacheable:
+        cache.set(page_key, response.content, _plan_page_timeout(starts, today))
+    return response
 
 
 def calendar(request):
@@ -70,10 +205,28 @@ def calendar(request):
     return render(request, 'management/calendar.html', context)
 
 
+def _full_calendar(window: Optional[Tuple[datetime, datetime]]):
+    if window:
+        appointments = Appointment.get_in_interval(*window)
+        cache_key = ical_cache_key(variant=_window_key(window))
+    else:
+        appointments = Appointment.objects.all()
+        cache_key = ical_cache_key()
+    cal = Appointment.iter_ical(appointments, title='Sprechstundenplan', cache_key=cache_key)
+    return StreamingHttpResponse(cal, content_type='text/plain')
+
+
+@cache_control(public=True, max_age=settings.FEED_CACHE_MAX_AGE)
+@condition(etag_func=feed_etag(*FULL_CALENDAR_TABLES, windowed=True),
+           last_modified_func=feed_last_modified(*FULL_CALENDAR_TABLES, windowed=True))
 def full_calendar(request):
-    appointments = Appointment.objects.all()
-    cal = Appointment.as_ical(appointments, title='Sprechstundenplan')
-    return HttpResponse(content=cal, content_type='text/plain')
+    return _full_calendar(ical_window(request))
+
+
+@cache_control(public=True, max_age=settings.FEED_CACHE_MAX_AGE)
+@condition(etag_func=feed_etag(*FULL_CALENDAR_TABLES), last_modified_func=feed_last_modified(*FULL_CALENDAR_TABLES))
+def full_calendar_archive(request):
+    return _full_calendar(None)
 
 
 @staff_member_required(login_url=settings.LOGIN_URL)
@@ -90,31 +243,75 @@ def create_appointments(request):
             form.save()
 
     today = date.today()
-
-    def for_month(i):
-        return datetime_plus_months(today, i)
-
     context = {
-        'appointments': itertools.chain(*[Appointment.create_for_month(
-            year=for_month(i).year,
-            month=for_month(i).month,
-        ) for i in range(months)])
+        'appointments': Appointment.create_for_months(year=today.year, month=today.month, months=months)
     }
 
     return render(request, 'management/create_appointments.html', context)
 
 
+def _admin_calendar(pk: int, window: Optional[Tuple[datetime, datetime]]):
+    admin = get_object_or_404(Admin, pk=pk)
+    if window:
+        appointments = Appointment.get_in_interval(*window).filter(admins=admin)
+        cache_key = ical_cache_key(admin.pk, variant=_window_key(window))
+    else:
+        appointments = admin.appointments.all()
+        cache_key = ical_cache_key(admin.pk)
+    cal = Appointment.iter_ical(appointments, title=f'Sprechstunden von {admin.name}', with_attendants=True,
+                                cache_key=cache_key)
+    return StreamingHttpResponse(cal, content_type='text/plain; charset=utf-8')
+
+
 @staff_member_required(login_url=settings.LOGIN_URL)
+@cache_control(private=True, max_age=settings.FEED_CACHE_MAX_AGE)
+@condition(etag_func=feed_etag(*ADMIN_CALENDAR_TABLES, windowed=True),
+           last_modified_func=feed_last_modified(*ADMIN_CALENDAR_TABLES, windowed=True))
 def admin_calendar(request, pk):
-    admin = get_object_or_404(Admin, pk=pk)
-    cal = Appointment.as_ical(admin.appointments.all(), title=f'Sprechstunden von {admin.name}', with_attendants=True)
-    return HttpResponse(content=cal, content_type='text/plain; charset=utf-8')
+    return _admin_calendar(pk, ical_window(request))
+
+
+@staff_member_required(login_url=settings.LOGIN_URL)
+@cache_control(private=True, max_age=settings.FEED_CACHE_MAX_AGE)
+@condition(etag_func=feed_etag(*ADMIN_CALENDAR_TABLES), last_modified_func=feed_last_modified(*ADMIN_CALENDAR_TABLES))
+def admin_calendar_archive(request, pk):
+    return _admin_calendar(pk, None)
+
+
+# columns of the admin list: sort key, label, css class and ordering
+ADMIN_COLUMNS = [
+    ('last_name', 'Nachname', 'col-sm-2', ('last_name', 'first_name')),
+    ('first_name', 'Vorname', 'col-sm-2', ('first_name', 'last_name')),
+    ('email', 'E-Mail', 'col-sm-4', ('email',)),
+    ('appointments', '# SS', 'col-sm-1', ('num_appointments', 'last_name', 'first_name')),
+    ('h_semesters', '# HS', 'col-sm-1', ('num_h_semesters', 'last_name', 'first_name')),
+]
 
 
 @staff_member_required(login_url=settings.LOGIN_URL)
 def manage_admins(request):
+    query = request.GET.get('q', '').strip()
+    sort = request.GET.get('sort', 'last_name')
+    orderings = {key: ordering for key, _, _, ordering in ADMIN_COLUMNS}
+    if sort.lstrip('-') not in orderings:
+        sort = 'last_name'
+    descending = sort.startswith('-')
+    ordering = [f'-{field}' if descending else field for field in orderings[sort.lstrip('-')]]
+
+    admins = Admin.with_counts(Admin.search(query) if query else None).order_by(*ordering)
+    page = Paginator(admins, settings.ADMINS_PER_PAGE).get_page(request.GET.get('page'))
+
     context = {
-        'admins': Admin.objects.order_by('last_name')
+        'admins': page,
+        'query': query,
+        'sort': sort,
+        'columns': [{
+            'label': label,
+            'css_class': css_class,
+            # a click on the sorted column reverses the order
+            'sort': f'-{key}' if sort == key else key,
+            'sorted': '▲' if sort == key else '▼' if sort == f'-{key}' else '',
+        } for key, label, css_class, _ in ADMIN_COLUMNS],
     }
     return render(request, 'management/manage_admins.html', context)
 
@@ -171,7 +368,8 @@ def edit_appointment(request, pk):
     appointment = get_object_or_404(Appointment, pk=pk)
     context = {
         'appointment': appointment,
-        'form': EditAppointmentForm(instance=appointment)
+        'form': EditAppointmentForm(instance=appointment),
+        'search_limit': settings.ADMIN_SEARCH_LIMIT,
     }
 
     if request.POST:
@@ -188,8 +386,7 @@ def edit_appointment(request, pk):
 @staff_member_required(login_url=settings.LOGIN_URL)
 def delete_appointment(request, pk):
     appointment = get_object_or_404(Appointment, pk=pk)
-    admins = appointment.admins
-    if admins.count() == 0:
+    if appointment.admin_count == 0:
         appointment.delete()
         messages.success(request, f"{appointment} wurde gelöscht")
     else:
@@ -197,34 +394,39 @@ def delete_appointment(request, pk):
     return redirect('management:index')
 
 
-@staff_member_required(login_url=settings.LOGIN_URL)
-def statistics(request):
-    to_date = request.GET.get('to_date')
-    if to_date:
-        try:
-            to_date = date.fromisoformat(to_date)
-        except ValueError:
-            to_date = None
+def _parse_date(value: Optional[str]) -> Optional[date]:
+    if not value:
+        return None
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        return None
+
 
+def _statistics_end(request) -> Tuple[date, datetime]:
+    to_date = _parse_date(request.GET.get('to_date'))
     if not to_date:
         # take datetime now to avoid showing a sprechstunde that has not happen yet
-        to_datetime = now()
-        to_date = date.today()
-    else:
-        # max time in order to include the sprechstunde that happened on that day
-        to_datetime = datetime.combine(to_date, datetime.max.time(), tzinfo=tz.gettz(settings.TIME_ZONE))
+        return date.today(), now()
 
-    count_query = Count(
-        'appointments',
-        filter=Q(appointments__end_time__lte=to_datetime)
-    )
+    # max time in order to include the sprechstunde that happened on that day
+    return to_date, datetime.combine(to_date, datetime.max.time(), tzinfo=tz.gettz(settings.TIME_ZONE))
 
-    admins = Admin.objects.annotate(num_appointments=count_query).filter(num_appointments__gte=1).order_by(
-        '-num_appointments')
 
-    for admin in admins:
-        admin.h_sem_count = admin.h_semester_count(to_date)
-        admin.ss_since_last_h_sem = admin.ss_since_last_h_semester(to_date)
+@staff_member_required(login_url=settings.LOGIN_URL)
+def statistics(request):
+    to_date, to_datetime = _statistics_end(request)
+
+    admin_timelines = timelines.all()
+    admins = []
+    for admin in Admin.objects.all():
+        timeline = admin_timelines.get(admin.pk, AdminTimeline())
+        admin.num_appointments = timeline.appointment_count(to_datetime)
+        if admin.num_appointments >= 1:
+            admin.h_sem_count = timeline.h_semester_count(to_date)
+            admin.ss_since_last_h_sem = timeline.appointments_since_last_h_semester(to_date)
+            admins.append(admin)
+    admins.sort(key=lambda a: a.num_appointments, reverse=True)
 
     context = {
         'to_date': to_date,
@@ -233,30 +435,51 @@ def statistics(request):
     return render(request, 'management/statistics.html', context)
 
 
+@staff_member_required(login_url=settings.LOGIN_URL)
+def statistics_semesters(request, export_format):
+    from_date = _parse_date(request.GET.get('from_date'))
+    to_date, to_datetime = _statistics_end(request)
+
+    breakdown = semester_breakdown(_start_of_day(from_date) if from_date else None, to_datetime)
+    rows = semester_rows(breakdown)
+    if export_format == 'json':
+        return StreamingHttpResponse(iter_json(rows), content_type='application/json')
+
+    response = StreamingHttpResponse(iter_csv(rows), content_type='text/csv; charset=utf-8')
+    response['Content-Disposition'] = f'attachment; filename="sprechstunden-{to_date.isoformat()}.csv"'
+    return response
+
+
 @staff_member_required(login_url=settings.LOGIN_URL)
 def app_settings(request):
+    if request.POST:
+        form = SettingsForm(data=request.POST)
+        if form.is_valid():
+            form.save()
+
+    setting_groups = [
+        (name, list(rows))
+        for name, rows in itertools.groupby(Settings.objects.order_by('name', 'pk'), key=lambda s: s.name)
+    ]
     context = {
         'settings': [{
-            'fields': Settings.objects.filter(name=name),
+            'fields': rows,
             'name': name,
             'verbose_name': Settings.verbose_name(name)
-        } for name in Settings.objects.all().values_list('name', flat=True).distinct()],
+        } for name, rows in setting_groups],
         'forms': [{
             'name': name,
             'verbose_name': Settings.verbose_name(name),
-            'form': SettingsForm(setting_name=name)
-        } for name in Settings.objects.all().values_list('name', flat=True).distinct()],
+            'form': SettingsForm(setting_name=name, setting_rows=rows)
+        } for name, rows in setting_groups],
     }
 
-    if request.POST:
-        form = SettingsForm(data=request.POST)
-        if form.is_valid():
-            form.save()
-
     return render(request, 'management/settings.html', context)
 
 
 @staff_member_required(login_url=settings.LOGIN_URL)
+@cache_control(private=True, max_age=settings.API_CACHE_MAX_AGE)
+@condition(etag_func=feed_etag(*ADMINS_TABLES), last_modified_func=feed_last_modified(*ADMINS_TABLES))
 def api_list_admins(request):
     admins = Admin.objects.all()
 
@@ -271,21 +494,141 @@ def api_list_admins(request):
     return JsonResponse(json_payload, safe=False)
 
 
-def api_list_appointments(request):
-    elements = request.GET.get('elements')
-    if not elements or not elements.isnumeric():
-        elements = 2
-    else:
-        elements = int(elements)
-    now = timezone.now()
-    appointments = Appointment.objects.filter(start_time__gte=now)[:elements]
+@staff_member_required(login_url=settings.LOGIN_URL)
+def api_search_admins(request):
+    admins = Admin.search(request.GET.get('q', ''))[:settings.ADMIN_SEARCH_LIMIT]
 
     json_payload = [
         {
-            'start': appointment.start_time.timestamp(),
-            'end': appointment.end_time.timestamp(),
-            'count': appointment.admins.all().count()
-        } for appointment in appointments
+            'id': admin.pk,
+            'name': admin.name
+        } for admin in admins
     ]
 
     return JsonResponse(json_payload, safe=False)
+
+
+def _upcoming_appointments(elements: int) -> Tuple[str, str]:
+    """
+    Return the json list of the next `elements` appointments and its ETag.
+    Both are cached for a few seconds, so polling displays cost a single
+    cache lookup.
+    """
+    cache_key = f'management:api:appointments:{elements}'
+    cached = cache.get(cache_key)
+    if cached is None:
+        appointments = Appointment.objects.filter(start_time__gte=timezone.now()).order_by('start_time').values_list(
+            'start_time', 'end_time', 'admin_count')[:elements]
+        content = json.dumps([
+            {
+                'start': start_time.timestamp(),
+                'end': end_time.timestamp(),
+                'count': count
+            } for start_time, end_time, count in appointments
+        ], cls=DjangoJSONEncoder)
+        cached = content, quote_etag(hashlib.sha256(content.encode()).hexdigest()[:32])
+        cache.set(cache_key, cached, settings.API_PAYLOAD_CACHE_TIMEOUT)
+    return cached
+
+
+@cache_control(public=True, max_age=settings.API_CACHE_MAX_AGE)
+def api_list_appointments(request):
+    elements = request.GET.get('elements')
+    if not elements or not elements.isdecimal():
+        elements = 2
+    else:
+        elements = min(int(elements), settings.API_MAX_ELEMENTS)
+
+    content, etag = _upcoming_appointments(elements)
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = HttpResponse(content, content_type='application/json')
+    response.headers['ETag'] = etag
+    return response
+
+
+def api_list_changes(request):
+    """
+    Changes since the cursor `since`, oldest first. Clients pass the returned
+    cursor as `since` next time, and start over from 0 if the cursor expired.
+    """
+    # id of the last change seen and the compaction it was issued after
+    cursor = re.fullmatch(r'(\d+)(?:\.(\d+))?', request.GET.get('since', '0'))
+    if not cursor:
+        return JsonResponse({'error': 'since must be a cursor'}, status=400)
+    since, generation = int(cursor.group(1)), int(cursor.group(2) or 0)
+    if Change.cursor_expired(since, generation):
+        return JsonResponse({'error': 'cursor expired'}, status=410)
+
+    # before the query, a compaction in between is caught by the next request
+    generation = Change.generation()
+    changes = Change.objects.filter(pk__gt=since)
+    if not request.user.is_staff:
+        changes = changes.exclude(kind=Change.H_SEMESTER)
+    changes = list(changes[:settings.CHANGES_PAGE_SIZE + 1])
+    more = len(changes) > settings.CHANGES_PAGE_SIZE
+    changes = changes[:settings.CHANGES_PAGE_SIZE]
+
+    return JsonResponse({
+        'changes': [change.as_json() for change in changes],
+        'cursor': f'{changes[-1].pk if changes else since}.{generation}',
+        'more': more,
+    })
+
+
+def _sse(change: Change) -> str:
+    data = json.dumps(change.as_json(), cls=DjangoJSONEncoder)
+    return f'id: {change.pk}\nevent: change\ndata: {data}\n\n'
+
+
+def _missed_changes(last_seen: int) -> Optional[List[Change]]:
+    """the public changes after `last_seen`, None if they cannot be replayed"""
+    if Change.cursor_expired(last_seen, 0):
+        return None
+    changes = Change.objects.filter(pk__gt=last_seen).exclude(kind=Change.H_SEMESTER)
+    changes = list(changes[:settings.CHANGES_PAGE_SIZE + 1])
+    return changes if len(changes) <= settings.CHANGES_PAGE_SIZE else None
+
+
+async def _event_stream(last_seen: Optional[int]):
+    subscription = broadcaster().subscribe()
+    try:
+        yield f'retry: {settings.EVENTS_RETRY * 1000}\n\n'
+
+        # replay what a reconnecting client missed, it has to reload everything if that is too much
+        if last_seen is not None:
+            missed = await sync_to_async(_missed_changes)(last_seen)
+            if missed is None:
+                latest = await sync_to_async(Change.objects.values_list('pk', flat=True).last)()
+                yield f'id: {latest or 0}\nevent: reset\ndata: \n\n'
+                return
+            for change in missed:
+                yield _sse(change)
+                last_seen = change.pk
+
+        # the client reconnects and catches up if events were dropped
+        while not subscription.overflowed:
+            change = await subscription.get(settings.EVENTS_KEEPALIVE)
+            if change is None:
+                yield ': keepalive\n\n'
+            elif change.kind != Change.H_SEMESTER and (last_seen is None or change.pk > last_seen):
+                yield _sse(change)
+    finally:
+        broadcaster().unsubscribe(subscription)
+
+
+async def plan_events(request):
+    """
+    Server-sent events with the changes of appointments, admins and who staffs
+    which appointment, in the format of changes.json. Only works when served
+    through ASGI, a WSGI worker would be blocked by every client.
+    """
+    if not settings.EVENTS_ENABLED:
+        raise Http404()
+    last_event_id = request.headers.get('Last-Event-ID', '')
+    response = StreamingHttpResponse(_event_stream(int(last_event_id) if last_event_id.isdecimal() else None),
+                                     content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # keep proxies like nginx from buffering the stream
+    response['X-Accel-Buffering'] = 'no'
+    return response
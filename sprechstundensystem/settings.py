@@ -112,6 +112,20 @@ AUTH_PASSWORD_VALIDATORS = [
 ]
 
 
+# Cache for rendered feeds and plan pages. Their versions are kept in the database, so every worker notices
+# changes even with a cache per process, a shared backend (e.g. memcached) just saves rendering per worker
+# https://docs.djangoproject.com/en/3.1/topics/cache/
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'OPTIONS': {
+            # room for the events of all ical feeds
+            'MAX_ENTRIES': 20000,
+        },
+    }
+}
+
 # Internationalization
 # https://docs.djangoproject.com/en/3.1/topics/i18n/
 
@@ -145,3 +159,66 @@ DEFAULT_MAILING_LIST = 'admins@stustanet.de'
 DEFAULT_SENDER = 'sprechstundensystemspamschleuder'
 DEFAULT_REMINDER_NOTE = ''  # TODO: some sane default
 APPOINTMENT_UNDERSTAFFED_THRESHOLD = 2
+# appointments claimed for their reminders at once by send_notifications
+REMINDER_BATCH_SIZE = 50
+# run_scheduler: seconds between checks for changed appointments, and between checks for enough future appointments
+SCHEDULER_POLL_INTERVAL = 60
+SCHEDULER_DATES_CHECK_INTERVAL = 24 * 60 * 60
+
+# mail outbox, drained by the deliver_mail command: parallel SMTP connections, mails fetched at once,
+# attempts before a mail is given up, and the retry delay (seconds) that doubles with every failed attempt
+MAIL_WORKERS = 4
+MAIL_BATCH_SIZE = 100
+MAIL_MAX_ATTEMPTS = 8
+MAIL_RETRY_DELAY = 60
+MAIL_RETRY_MAX_DELAY = 6 * 60 * 60
+# seconds a batch of mails is reserved for the deliver_mail run that claimed it, has to outlast sending the batch
+MAIL_LEASE = 15 * 60
+
+# academic calendar as (month, day, lecture time, label) of the first day of each period,
+# a period lasts until the next one starts
+ACADEMIC_PERIODS = [
+    (2, 1, False, 'Vorlesungsfreie Zeit (Winter)'),
+    (4, 1, True, 'Sommersemester'),
+    (8, 1, False, 'Vorlesungsfreie Zeit (Sommer)'),
+    (10, 1, True, 'Wintersemester'),
+]
+
+# Cache-Control max-age (seconds) of the ical and json feeds
+FEED_CACHE_MAX_AGE = 300
+API_CACHE_MAX_AGE = 60
+
+# maximum number of appointments returned by appointments.json, and how long (seconds) the server caches the list
+API_MAX_ELEMENTS = 50
+API_PAYLOAD_CACHE_TIMEOUT = 10
+# number of matches returned by the admin search
+ADMIN_SEARCH_LIMIT = 10
+ADMIN_SEARCH_MAX_WORDS = 4
+# rows per page of the admin list
+ADMINS_PER_PAGE = 50
+
+# changes.json: changes per page, and days until superseded changes and deletions are compacted
+CHANGES_PAGE_SIZE = 500
+CHANGES_RETENTION_DAYS = 30
+
+# server-sent events (/events), live updates of the plan. Needs an ASGI server like uvicorn or daphne
+# (see README), under WSGI every open plan page would block a worker, so this is off by default.
+# LocalBroadcaster only sees changes of its own process, use management.events.ChangeLogBroadcaster with several workers
+EVENTS_ENABLED = False
+EVENTS_BACKEND = 'management.events.LocalBroadcaster'
+EVENTS_QUEUE_SIZE = 100
+# seconds between polls of the change log, between keepalive comments and until clients reconnect
+EVENTS_POLL_INTERVAL = 2
+EVENTS_KEEPALIVE = 30
+EVENTS_RETRY = 5
+
+# lifetime (seconds) of rendered feeds in the cache, they are invalidated on changes anyway
+ICAL_CACHE_TIMEOUT = 24 * 60 * 60
+ICAL_EVENT_CACHE_TIMEOUT = 7 * 24 * 60 * 60
+PLAN_CACHE_TIMEOUT = 24 * 60 * 60
+
+# default interval of the ical feeds in days around today, the archive feeds contain everything
+ICAL_DEFAULT_PAST_DAYS = 90
+ICAL_DEFAULT_FUTURE_DAYS = 365
+# upper bound for ?past_days= and ?future_days=
+ICAL_MAX_DAYS = 10 * 365